@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""bench_dispatch.py: VUT FIT - IPP, instructions per second of a tight JUMP/ADD loop.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import argparse
+import tempfile
+
+from common import INTERPRET, interpreter_at, time_run, write_program
+
+
+def loop_program(iterations):
+    """
+    Builds a counting loop, which executes 3 * iterations + 2 instructions.
+    :param iterations: Number of loop iterations.
+    :return: Program lines.
+    """
+    return ['DEFVAR GF@i',
+            'MOVE GF@i int@0',
+            'LABEL loop',
+            'ADD GF@i GF@i int@1',
+            f'JUMPIFEQ end GF@i int@{iterations}',
+            'JUMP loop',
+            'LABEL end']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the dispatch speed of interpret.py on a JUMP/ADD loop.')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', metavar='REV', help='git revision of interpret.py to compare against')
+    parser.add_argument('--engine', help='execution engine of the working tree interpreter')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        interpreters = [('working tree', INTERPRET, [f'--engine={args.engine}'] if args.engine else [])]
+        if args.compare:
+            interpreters.insert(0, (args.compare, interpreter_at(args.compare, tmp), []))
+        empty = write_program([], tmp)
+        loop = write_program(loop_program(args.iterations), tmp)
+        executed = 3 * args.iterations + 2
+        results = []
+        for name, interpreter, extra_args in interpreters:
+            startup = time_run(interpreter, empty, repeat=args.repeat, extra_args=extra_args)
+            elapsed = time_run(interpreter, loop, repeat=args.repeat, extra_args=extra_args) - startup
+            results.append(executed / elapsed)
+            print(f'{name:>16}: {executed} instructions in {elapsed:.3f} s, {results[-1]:,.0f} instructions/s')
+        if len(results) == 2:
+            print(f'{"speedup":>16}: {results[1] / results[0]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
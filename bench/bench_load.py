@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""bench_load.py: VUT FIT - IPP, load time of interpret.py depending on the program size.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import argparse
+import os
+import random
+import tempfile
+from xml.sax.saxutils import escape
+
+from common import INTERPRET, interpreter_at, time_run
+
+
+def write_shuffled_program(size, directory):
+    """
+    Generates a program with the given number of instructions in random order. The first instruction
+    ends the program, so the measured time is spent loading it.
+    :param size: Number of instructions.
+    :param directory: Directory for the file.
+    :return: Path to the XML file.
+    """
+    lines = ['EXIT int@0']
+    for num in range(1, size):
+        if num % 10 == 0:
+            lines.append(f'LABEL l{num}')
+        elif num % 10 == 1:
+            lines.append(f'DEFVAR GF@v{num}')
+        else:
+            lines.append(f'WRITE string@line\\032{num}')
+    orders = list(range(1, size + 1))
+    random.Random(size).shuffle(orders)
+    path = os.path.join(directory, f'load-{size}.xml')
+    with open(path, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<program language="IPPcode21">\n')
+        for order in orders:
+            opcode, *args = lines[order - 1].split()
+            file.write(f'<instruction order="{order}" opcode="{opcode}">')
+            for num, arg in enumerate(args, 1):
+                if opcode == 'LABEL':
+                    arg_type, text = 'label', arg
+                elif arg.startswith('GF@'):
+                    arg_type, text = 'var', arg
+                else:
+                    arg_type, text = arg.split('@', 1)
+                file.write(f'<arg{num} type="{arg_type}">{escape(text)}</arg{num}>')
+            file.write('</instruction>\n')
+        file.write('</program>\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how the load time of interpret.py scales.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', metavar='REV', help='git revision of interpret.py to compare against')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        interpreters = [('working tree', INTERPRET)]
+        if args.compare:
+            interpreters.insert(0, (args.compare, interpreter_at(args.compare, tmp)))
+        sources = {size: write_shuffled_program(size, tmp) for size in args.sizes}
+        empty = write_shuffled_program(1, tmp)
+        for name, interpreter in interpreters:
+            print(f'{name}:')
+            startup = time_run(interpreter, empty, repeat=args.repeat)
+            for size in args.sizes:
+                elapsed = time_run(interpreter, sources[size], repeat=args.repeat) - startup
+                print(f'{size:>10} instructions: {elapsed:8.3f} s, {elapsed / size * 1e6:7.2f} us/instruction')
+
+
+if __name__ == '__main__':
+    main()
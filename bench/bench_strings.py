@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""bench_strings.py: VUT FIT - IPP, building a long string character by character with CONCAT and SETCHAR.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import argparse
+import tempfile
+
+from common import INTERPRET, interpreter_at, time_run, write_program
+
+
+def concat_program(size):
+    """
+    Appends one character at a time, which executes 3 * size + 3 instructions.
+    :param size: Length of the built string.
+    :return: Program lines.
+    """
+    return ['DEFVAR GF@s',
+            'DEFVAR GF@i',
+            'MOVE GF@s string@',
+            'MOVE GF@i int@0',
+            'LABEL loop',
+            'CONCAT GF@s GF@s string@x',
+            'ADD GF@i GF@i int@1',
+            f'JUMPIFNEQ loop GF@i int@{size}',
+            'STRLEN GF@i GF@s',
+            'WRITE GF@i']
+
+
+def setchar_program(size):
+    """
+    Doubles a string up to the size and then rewrites it one character at a time with SETCHAR.
+    :param size: Length of the built string, a power of two.
+    :return: Program lines.
+    """
+    return ['DEFVAR GF@s',
+            'DEFVAR GF@i',
+            'MOVE GF@s string@x',
+            'LABEL double',
+            'CONCAT GF@s GF@s GF@s',
+            'STRLEN GF@i GF@s',
+            f'JUMPIFNEQ double GF@i int@{size}',
+            'MOVE GF@i int@0',
+            'LABEL loop',
+            'SETCHAR GF@s GF@i string@y',
+            'ADD GF@i GF@i int@1',
+            f'JUMPIFNEQ loop GF@i int@{size}',
+            'GETCHAR GF@s GF@s int@0',
+            'WRITE GF@s']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures building a string character by character in interpret.py.')
+    parser.add_argument('--size', type=int, default=1 << 20, help='string length, rounded up to a power of two')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--compare', metavar='REV', help='git revision of interpret.py to compare against')
+    parser.add_argument('--engine', help='execution engine of the working tree interpreter')
+    args = parser.parse_args()
+    size = 1 << max(args.size - 1, 1).bit_length()
+    with tempfile.TemporaryDirectory() as tmp:
+        interpreters = [('working tree', INTERPRET, [f'--engine={args.engine}'] if args.engine else [])]
+        if args.compare:
+            interpreters.insert(0, (args.compare, interpreter_at(args.compare, tmp), []))
+        programs = [('CONCAT', write_program(concat_program(size), tmp)),
+                    ('SETCHAR', write_program(setchar_program(size), tmp))]
+        for program, source in programs:
+            results = []
+            for name, interpreter, extra_args in interpreters:
+                results.append(time_run(interpreter, source, repeat=args.repeat, extra_args=extra_args))
+                print(f'{program:>8} {name:>16}: {size} characters in {results[-1]:.3f} s, '
+                      f'{size / results[-1]:,.0f} characters/s')
+            if len(results) == 2:
+                print(f'{program:>8} {"speedup":>16}: {results[0] / results[1]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
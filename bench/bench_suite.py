@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""bench_suite.py: VUT FIT - IPP, speed of interpret.py on the representative programs in bench/suite.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+
+from common import INTERPRET, REPO_DIR, interpreter_at, measure_run, write_program
+
+SUITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+"""
+Programs of the suite and the generators of their input.
+"""
+SUITE = {
+    'arith': None,
+    'recursion': None,
+    'strings': None,
+    'stack': None,
+    'read': lambda: ''.join(f'{i * 7919 % 10007}\nline {i}\n' for i in range(20000)),
+}
+
+
+def exit_variant(source, directory):
+    """
+    Prepends EXIT to the program, so running it measures the startup and the load of the program only.
+    :param source: Path to the XML source.
+    :param directory: Directory for the new file.
+    :return: Path to the new XML file.
+    """
+    tree = ET.parse(source)
+    root = tree.getroot()
+    for instruction in root:
+        instruction.set('order', str(int(instruction.get('order')) + 1))
+    exit_instruction = ET.Element('instruction', order='1', opcode='EXIT')
+    ET.SubElement(exit_instruction, 'arg1', type='int').text = '0'
+    root.insert(0, exit_instruction)
+    path = os.path.join(directory, 'exit-' + os.path.basename(source))
+    tree.write(path, encoding='UTF-8', xml_declaration=True)
+    return path
+
+
+def executed_instructions(source, input_path, directory):
+    """
+    Counts the instructions executed by the unoptimized program using the profiler of the working tree.
+    :param source: Path to the XML source.
+    :param input_path: Path to the input file.
+    :param directory: Directory for the profile report.
+    :return: Number of executed instructions.
+    """
+    report = os.path.join(directory, 'profile.json')
+    measure_run(INTERPRET, source, input_path, [f'--profile={report}', '--profile-format=json'])
+    with open(report) as file:
+        return json.load(file)['count']
+
+
+def best_run(interpreter, source, input_path, repeat, extra_args):
+    """
+    :return: Best wall time in seconds and the largest peak RSS in KiB out of several runs.
+    """
+    runs = [measure_run(interpreter, source, input_path, extra_args) for _ in range(repeat)]
+    return min(elapsed for elapsed, _ in runs), max(rss for _, rss in runs)
+
+
+def revision(name):
+    """
+    :param name: Git revision or None for the working tree.
+    :return: Commit hash of the revision, marked if the working tree has uncommitted changes.
+    """
+    commit = subprocess.run(['git', '-C', REPO_DIR, 'rev-parse', name or 'HEAD'],
+                            check=True, capture_output=True, text=True).stdout.strip()
+    if name is None and subprocess.run(['git', '-C', REPO_DIR, 'diff', '--quiet', 'HEAD', '--', 'interpret.py']
+                                       ).returncode:
+        commit += '-dirty'
+    return commit
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures interpret.py on the programs of the benchmark suite.')
+    parser.add_argument('programs', nargs='*', help=f'programs to run, all by default: {", ".join(SUITE)}')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--revision', metavar='REV', help='git revision of interpret.py to measure')
+    parser.add_argument('--output', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--engine', help='execution engine of the measured interpreter')
+    parser.add_argument('--opt-level', type=int, help='optimization level of the measured interpreter')
+    args = parser.parse_args()
+    extra_args = [f'--engine={args.engine}'] if args.engine else []
+    if args.opt_level is not None:
+        extra_args.append(f'--opt-level={args.opt_level}')
+    for name in args.programs:
+        if name not in SUITE:
+            parser.error(f'Unknown program {name}.')
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['programs']
+    with tempfile.TemporaryDirectory() as tmp:
+        interpreter = interpreter_at(args.revision, tmp) if args.revision else INTERPRET
+        empty = write_program([], tmp)
+        startup, _ = best_run(interpreter, empty, os.devnull, args.repeat, extra_args)
+        results = {}
+        for name in args.programs or SUITE:
+            source = os.path.join(SUITE_DIR, f'{name}.xml')
+            input_path = os.devnull
+            if SUITE[name] is not None:
+                input_path = os.path.join(tmp, f'{name}.in')
+                with open(input_path, 'w') as file:
+                    file.write(SUITE[name]())
+            instructions = executed_instructions(source, input_path, tmp)
+            loaded, _ = best_run(interpreter, exit_variant(source, tmp), input_path, args.repeat, extra_args)
+            elapsed, peak_rss = best_run(interpreter, source, input_path, args.repeat, extra_args)
+            results[name] = {
+                'instructions': instructions,
+                'time_s': elapsed,
+                'load_s': max(loaded - startup, 0.0),
+                'instructions_per_s': instructions / max(elapsed - loaded, 1e-9),
+                'peak_rss_kib': peak_rss,
+            }
+            line = (f'{name:>10}: {instructions:>8} instructions, {results[name]["instructions_per_s"]:>12,.0f}'
+                    f' instructions/s, load {results[name]["load_s"] * 1000:7.1f} ms, peak RSS {peak_rss:>7} KiB')
+            if baseline and name in baseline:
+                line += f', speedup {results[name]["instructions_per_s"] / baseline[name]["instructions_per_s"]:.2f}x'
+            print(line)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'revision': revision(args.revision), 'python': platform.python_version(),
+                       'interpreter_args': extra_args, 'startup_s': startup, 'programs': results}, file, indent=2)
+            file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
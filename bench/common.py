@@ -0,0 +1,116 @@
+"""common.py: VUT FIT - IPP, shared helpers for the interpret.py benchmarks.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INTERPRET = os.path.join(REPO_DIR, 'interpret.py')
+
+"""
+Instructions with a label as the first argument and READ with a type as the second one.
+"""
+LABEL_OPCODES = ['CALL', 'LABEL', 'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS']
+
+
+def assemble(lines):
+    """
+    Translates IPPcode21 source lines into the XML representation read by interpret.py.
+    :param lines: Lines of the IPPcode21 program, without the header.
+    :return: XML document as a string.
+    """
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode21">']
+    order = 0
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        opcode = tokens[0].upper()
+        order += 1
+        out.append(f'<instruction order="{order}" opcode="{opcode}">')
+        for num, token in enumerate(tokens[1:], 1):
+            if (num == 1 and opcode in LABEL_OPCODES) or (num == 2 and opcode == 'READ'):
+                arg_type, text = ('label' if opcode != 'READ' else 'type'), token
+            elif token.split('@', 1)[0] in ['GF', 'LF', 'TF']:
+                arg_type, text = 'var', token
+            else:
+                arg_type, text = token.split('@', 1)
+            out.append(f'<arg{num} type="{arg_type}">{escape(text)}</arg{num}>')
+        out.append('</instruction>')
+    out.append('</program>')
+    return '\n'.join(out) + '\n'
+
+
+def write_program(lines, directory):
+    """
+    Assembles the program and stores it in a temporary file.
+    :param lines: Lines of the IPPcode21 program.
+    :param directory: Directory for the file.
+    :return: Path to the XML file.
+    """
+    fd, path = tempfile.mkstemp(suffix='.xml', dir=directory)
+    with os.fdopen(fd, 'w') as file:
+        file.write(assemble(lines))
+    return path
+
+
+def interpreter_at(revision, directory):
+    """
+    Exports interpret.py from a git revision, so two versions can be compared.
+    :param revision: Git revision.
+    :param directory: Directory for the exported file.
+    :return: Path to the exported interpret.py.
+    """
+    source = subprocess.run(['git', '-C', REPO_DIR, 'show', f'{revision}:interpret.py'],
+                            check=True, capture_output=True).stdout
+    path = os.path.join(directory, f'interpret-{revision.replace("/", "_")}.py')
+    with open(path, 'wb') as file:
+        file.write(source)
+    return path
+
+
+def time_run(interpreter, source, input_path=os.devnull, repeat=3, extra_args=()):
+    """
+    Runs the interpreter and measures the best wall time out of several runs.
+    :param interpreter: Path to interpret.py.
+    :param source: Path to the XML source.
+    :param input_path: Path to the input file.
+    :param repeat: Number of runs.
+    :param extra_args: Additional command line arguments.
+    :return: Best wall time in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, interpreter, f'--source={source}', f'--input={input_path}', *extra_args],
+                       check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def measure_run(interpreter, source, input_path=os.devnull, extra_args=()):
+    """
+    Runs the interpreter once and measures its wall time and peak memory.
+    :param interpreter: Path to interpret.py.
+    :param source: Path to the XML source.
+    :param input_path: Path to the input file.
+    :param extra_args: Additional command line arguments.
+    :return: Wall time in seconds, peak resident set size in KiB.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, interpreter, f'--source={source}', f'--input={input_path}',
+                                *extra_args], stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    return elapsed, usage.ru_maxrss
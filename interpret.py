@@ -9,11 +9,39 @@ import xml.etree.ElementTree as ET
 import sys
 import re
 import string
+import os
+import stat
+import signal
+import io
+import json
+import time
+import hashlib
+import marshal
+import tempfile
+import operator
 from operator import attrgetter
+# * asyncio, concurrent.futures, socket and threading are slow to import and only needed by the batch,
+# * the scheduler and the server, so they are imported by the functions that use them
+
+"""
+Version of the interpreter, part of the key of the compiled program cache.
+"""
+VERSION = '2.0'
+
+"""
+Default number of characters collected by Output before they are written.
+"""
+OUTPUT_BUFFER = 65536
+
+"""
+Default number of instructions a scheduled program executes before it lets the other programs run.
+"""
+QUANTUM = 1000
 
 """
 List of error codes.
 """
+ERR_INPUT_FILE = 11
 ERR_INVALID_FORMAT = 31
 ERR_INVALID_STRUCT = 32
 ERR_SEM = 52
@@ -23,16 +51,160 @@ ERR_FRAME = 55
 ERR_VALUE_MISSING = 56
 ERR_VALUE_WRONG = 57
 ERR_STRING = 58
+ERR_INTERNAL = 99
+
+"""
+Opcodes of the compiled instructions, the position in the tuple is the opcode number.
+"""
+OPCODES = (
+    'MOVE', 'CREATEFRAME', 'PUSHFRAME', 'POPFRAME', 'DEFVAR', 'CALL', 'RETURN', 'PUSHS', 'POPS', 'ADD', 'SUB', 'MUL',
+    'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT', 'INT2CHAR', 'STRI2INT', 'READ', 'WRITE', 'CONCAT', 'STRLEN',
+    'GETCHAR', 'SETCHAR', 'TYPE', 'LABEL', 'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'EXIT', 'DPRINT', 'BREAK', 'CLEARS',
+    'ADDS', 'SUBS', 'MULS', 'IDIVS', 'LTS', 'GTS', 'EQS', 'ANDS', 'ORS', 'NOTS', 'INT2CHARS', 'STRI2INTS',
+    'JUMPIFEQS', 'JUMPIFNEQS',
+    # * internal instructions created by the Optimizer, they can not appear in the source XML
+    'COMPARE_JUMP_TRUE', 'COMPARE_JUMP_FALSE', 'STACK_OPERATION',
+    'ADD_INT', 'SUB_INT', 'MUL_INT', 'IDIV_INT', 'LT_TYPED', 'GT_TYPED', 'EQ_TYPED', 'AND_BOOL', 'OR_BOOL',
+    'NOT_BOOL', 'CONCAT_STRING', 'STRLEN_STRING', 'GETCHAR_TYPED', 'JUMPIFEQ_TYPED', 'JUMPIFNEQ_TYPED'
+)
+OPCODE_NUMBERS = {name: number for number, name in enumerate(OPCODES)}
+JUMP_OPCODES = {OPCODE_NUMBERS[name] for name in ['CALL', 'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS',
+                                                  'JUMPIFEQ_TYPED', 'JUMPIFNEQ_TYPED']}
+CONDITIONAL_JUMPS = {OPCODE_NUMBERS[name] for name in ['JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS',
+                                                       'JUMPIFEQ_TYPED', 'JUMPIFNEQ_TYPED', 'COMPARE_JUMP_TRUE',
+                                                       'COMPARE_JUMP_FALSE']}
+BLOCK_ENDS = JUMP_OPCODES | CONDITIONAL_JUMPS | {OPCODE_NUMBERS['RETURN'], OPCODE_NUMBERS['EXIT']}
+CALL_OPCODES = {OPCODE_NUMBERS['CALL'], OPCODE_NUMBERS['RETURN']}
+
+"""
+Marks a global frame slot whose variable was not defined yet.
+"""
+UNDEFINED = object()
+
+
+class InterpretError(Exception):
+    """
+    Error stopping the interpretation. The command line interface writes the message to stderr and exits
+    with the code, the subclasses tell the kinds of errors apart.
+    """
+    code = ERR_INTERNAL
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        if code is not None:
+            self.code = code
+
+
+class InputFileError(InterpretError):
+    """
+    The input file or the batch manifest can not be read, or the server socket path can not be used.
+    """
+    code = ERR_INPUT_FILE
+
+
+class XMLFormatError(InterpretError):
+    """
+    The source is not a well-formed XML document.
+    """
+    code = ERR_INVALID_FORMAT
+
+
+class XMLStructureError(InterpretError):
+    """
+    The source XML is not a valid IPPcode21 program.
+    """
+    code = ERR_INVALID_STRUCT
+
+
+class SemanticError(InterpretError):
+    """
+    Undefined or redefined label, or a redefined variable.
+    """
+    code = ERR_SEM
+
+
+class OperandTypeError(InterpretError):
+    """
+    Wrong types of the operands.
+    """
+    code = ERR_TYPES
+
+
+class VariableError(InterpretError):
+    """
+    Access to a variable which does not exist.
+    """
+    code = ERR_VAR
+
+
+class FrameError(InterpretError):
+    """
+    Access to a frame which does not exist.
+    """
+    code = ERR_FRAME
+
+
+class MissingValueError(InterpretError):
+    """
+    Missing value in a variable, on the data stack or on the call stack.
+    """
+    code = ERR_VALUE_MISSING
+
+
+class OperandValueError(InterpretError):
+    """
+    Wrong value of an operand, e.g. division by zero or an invalid EXIT code.
+    """
+    code = ERR_VALUE_WRONG
+
+
+class StringError(InterpretError):
+    """
+    Wrong string operation, e.g. an index out of range.
+    """
+    code = ERR_STRING
+
+
+"""
+Exception classes raised by err, by the error code.
+"""
+ERROR_CLASSES = {error.code: error for error in [InputFileError, XMLFormatError, XMLStructureError, SemanticError,
+                                                  OperandTypeError, VariableError, FrameError, MissingValueError,
+                                                  OperandValueError, StringError]}
+
+
+class ProgramExit(Exception):
+    """
+    Raised by EXIT to end the program with the code.
+    """
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
 
 
 def err(msg, code):
     """
-    Prints the error message and exists with the correct error code.
+    Stops the interpretation with the error.
     :param msg: Error message.
     :param code: Error code.
+    :raises InterpretError: The subclass matching the code.
     """
-    sys.stderr.write(msg)
-    sys.exit(code)
+    raise ERROR_CLASSES.get(code, InterpretError)(msg, code)
+
+
+"""
+Regular expressions for the values of the argument types, compiled once.
+"""
+TEXT_REGEX = {
+    'var': re.compile(r'^(GF|LF|TF)@[a-žA-Ž_\-$&%*!?][a-žA-Ž0-9_\-$&%*!?]*$'),
+    'label': re.compile(r'^[a-žA-Ž_\-$&%*!?][a-žA-Ž0-9_\-$&%*!?]*$'),
+    'type': re.compile(r'^(int|string|bool)$'),
+    'int': re.compile(r'^[\-]?[0-9]+$'),
+    'bool': re.compile(r'^(true|false)$'),
+    'string': re.compile(r'^([^\s#\\\\]|\\[0-9]{3})*$'),
+    'nil': re.compile(r'^nil$')
+}
 
 
 def value_validity(attr_type, text):
@@ -42,40 +214,219 @@ def value_validity(attr_type, text):
     :param text: Checked value.
     :return: True if valid.
     """
-    text_regex = {
-        'var': r'^(GF|LF|TF)@[a-žA-Ž_\-$&%*!?][a-žA-Ž0-9_\-$&%*!?]*$',
-        'label': r'^[a-žA-Ž_\-$&%*!?][a-žA-Ž0-9_\-$&%*!?]*$',
-        'type': r'^(int|string|bool)$',
-        'int': r'^[\-]?[0-9]+$',
-        'bool': r'^(true|false)$',
-        'string': r'^([^\s#\\\\]|\\[0-9]{3})*$',
-        'nil': r'^nil$'
-    }
     if attr_type == 'string' and text is None:
         text = ''
-    text.replace("\\\\", "\\")
     try:
-        if re.search(re.compile(text_regex[attr_type]), text) is None:
+        if TEXT_REGEX[attr_type].search(text) is None:
             return False
-    except:
+    except (KeyError, TypeError):
         err("Argument text is missing.", ERR_INVALID_STRUCT)
     return True
 
 
+def decode_string(value):
+    """
+    Replaces the escape sequences with corresponding characters in a single pass.
+    :param value: String to convert, already checked by value_validity.
+    :return: Converted string.
+    """
+    index = value.find('\\')
+    if index == -1:
+        return value
+    parts = []
+    start = 0
+    while index != -1:
+        parts.append(value[start:index])
+        parts.append(chr(int(value[index + 1:index + 4])))
+        start = index + 4
+        index = value.find('\\', start)
+    parts.append(value[start:])
+    return ''.join(parts)
+
+
+def decode_constant(arg_type, text):
+    """
+    Converts the text of a constant argument to its value.
+    :param arg_type: Type of the argument.
+    :param text: Text of the argument.
+    :return: Decoded value, None for nil and for arguments that are not constants.
+    """
+    if arg_type == 'int':
+        return int(text)
+    if arg_type == 'string':
+        return decode_string(text)
+    if arg_type == 'bool':
+        return text == 'true'
+    return None
+
+
+def ipp_text(value, value_type):
+    """
+    Converts a runtime value to its IPPcode21 text form.
+    :param value: Value, bools are Python bools and nil is None.
+    :param value_type: Type of the value.
+    :return: Text of the value.
+    """
+    if value_type == 'bool':
+        return 'true' if value else 'false'
+    if value_type == 'nil':
+        return 'nil'
+    return str(value)
+
+
+"""
+Conversions of the runtime values to the text written by WRITE, values of other types are written by str.
+"""
+WRITTEN_TEXT = {'bool': lambda value: 'true' if value else 'false', 'nil': lambda _: ''}
+
+
+class Argument:
+    """
+    A pre-parsed instruction argument. Constants hold their decoded value, variables are split into
+    the frame and the name, variables in the global frame also get the slot in the frame.
+    """
+    __slots__ = ('type', 'text', 'value', 'frame', 'name', 'slot')
+
+    def __init__(self, arg_type, text):
+        self.type = arg_type
+        self.text = text
+        self.value = decode_constant(arg_type, text)
+        self.frame = None
+        self.name = None
+        self.slot = None
+        if arg_type == 'var':
+            frame, name = text.split('@', 1)
+            self.frame = sys.intern(frame)
+            self.name = sys.intern(name)
+
+    @classmethod
+    def constant(cls, arg_type, value):
+        """
+        Creates a constant argument from an already decoded value.
+        :param arg_type: Type of the constant.
+        :param value: Value of the constant.
+        :return: Argument object.
+        """
+        arg = cls.__new__(cls)
+        arg.type = arg_type
+        arg.text = ipp_text(value, arg_type)
+        arg.value = value
+        arg.frame = arg.name = arg.slot = None
+        return arg
+
+    def to_tuple(self):
+        """
+        :return: The argument as a tuple of plain values for the compiled program cache.
+        """
+        return self.type, self.text, self.value, self.frame, self.name, self.slot
+
+    @classmethod
+    def from_tuple(cls, values):
+        """
+        Restores the argument stored by to_tuple.
+        :param values: Tuple of the argument values.
+        :return: Argument object.
+        """
+        arg = cls.__new__(cls)
+        arg.type, arg.text, arg.value, frame, name, arg.slot = values
+        arg.frame = sys.intern(frame) if frame is not None else None
+        arg.name = sys.intern(name) if name is not None else None
+        return arg
+
+
+class Instruction:
+    """
+    A compiled instruction - opcode number, order, pre-parsed arguments and the resolved jump target.
+    Instructions fused by the Optimizer also keep the original instructions and the operation they apply.
+    """
+    __slots__ = ('opcode', 'order', 'args', 'target', 'parts', 'operation')
+
+    def __init__(self, opcode, order, args):
+        self.opcode = opcode
+        self.order = order
+        self.args = args
+        self.target = None
+        self.parts = None
+        self.operation = None
+
+    def to_tuple(self):
+        """
+        :return: The instruction as a tuple of plain values for the compiled program cache.
+        """
+        return self.opcode, self.order, tuple(arg.to_tuple() for arg in self.args), self.target
+
+    @classmethod
+    def from_tuple(cls, values):
+        """
+        Restores the instruction stored by to_tuple.
+        :param values: Tuple of the instruction values.
+        :return: Instruction object.
+        """
+        opcode, order, args, target = values
+        instruction = cls(opcode, order, tuple(Argument.from_tuple(arg) for arg in args))
+        instruction.target = target
+        return instruction
+
+
 class Preparation:
     """
     Parses and checks the validity of the source XML.
     """
     int_source = sys.stdin
     int_input = sys.stdin
-    instruction_dict = {}
-    root = None
+    input_opened = False
+    instructions = None
+    gf_slots = None
+    cache = None
+    output_buffer = OUTPUT_BUFFER
+    opt_level = 0
+    engine = 'reference'
+    opt_report = False
+    profile = None
+    profile_calls = None
+    profile_stacks = None
+    profile_format = 'table'
+    batch = None
+    batch_report = None
+    serve = None
+    args = None
 
-    def __init__(self):
-        self.argument_parse()
-        self.fill_dictionary()
+    def __init__(self, args=None, source=None, input_stream=None, cache=None):
+        """
+        :param args: Parsed arguments, the console arguments are parsed if None.
+        :param source: Path to the source XML, the XML document as bytes or a binary stream, overrides --source.
+        :param input_stream: Text stream read by READ, overrides --input.
+        :param cache: Compiled program cache, overrides --cache-dir.
+        """
+        self.instruction_dict = {}
+        self.argument_parse(args)
+        if source is not None:
+            self.int_source = io.BytesIO(source) if isinstance(source, bytes) else source
+        if input_stream is not None:
+            self.int_input = input_stream
+        if cache is not None:
+            self.cache = cache
+        if self.batch is None and self.serve is None:
+            self.fill_dictionary()
+            self.load_program()
+
+    def load_program(self):
+        """
+        Loads the compiled program from the cache, or parses the source XML and resolves the labels.
+        """
+        key = None
+        if self.cache is not None:
+            if self.int_source is sys.stdin:
+                self.int_source = io.BytesIO(sys.stdin.buffer.read())
+            key = self.cache.key(self.int_source)
+            program = self.cache.load(key)
+            if program is not None:
+                self.instructions, self.gf_slots = program
+                return
         self.xml_parse()
-        self.xml_validity()
+        Labels(self.instructions)
+        if key is not None:
+            self.cache.store(key, self.instructions, self.gf_slots)
 
     def fill_dictionary(self):
         """
@@ -101,306 +452,2789 @@ class Preparation:
         for key in ['CLEARS', 'ADDS', 'SUBS', 'MULS', 'IDIVS', 'LTS', 'GTS', 'EQS', 'ANDS', 'ORS', 'NOTS', 'INT2CHARS', 'STRI2INTS']:
             self.instruction_dict[key] = []
 
-    def argument_parse(self):
+    def argument_parse(self, args=None):
         """
         Parses the console arguments.
+        :param args: Already parsed arguments, used for the programs of a batch.
         """
-        parser = argparse.ArgumentParser(description='Add path to source or input. At least one has to be set.')
-        parser.add_argument('--source')
-        parser.add_argument('--input')
-        args = parser.parse_args()
-        if not (args.source or args.input):
-            parser.error('Add -source or -input. See --help for more info.')
+        if args is None:
+            args = self.parse_arguments()
+        self.args = args
         if args.source:
             self.int_source = args.source
         if args.input:
             try:
                 self.int_input = open(args.input, "r")
-            except:
-                err("Unable to open input file.", 11)
+                self.input_opened = True
+            except OSError:
+                err("Unable to open input file.", ERR_INPUT_FILE)
+        self.output_buffer = args.output_buffer
+        self.opt_level = args.opt_level
+        self.opt_report = args.opt_report
+        self.engine = args.engine
+        self.profile = args.profile
+        self.profile_calls = args.profile_calls
+        self.profile_stacks = args.profile_stacks
+        self.profile_format = args.profile_format
+        self.batch = args.batch
+        self.batch_report = args.batch_report
+        self.serve = args.serve
+        if args.cache_dir:
+            self.cache = ProgramCache(args.cache_dir, int(args.cache_max_size * 1024 * 1024),
+                                      args.cache_max_age * 24 * 60 * 60)
+
+    @staticmethod
+    def parse_arguments():
+        """
+        :return: Namespace of the console arguments.
+        """
+        parser = Preparation.argument_parser()
+        args = parser.parse_args()
+        profiled = args.profile or args.profile_calls or args.profile_stacks
+        if args.batch and args.serve:
+            parser.error('--batch and --serve cannot be used together.')
+        if args.batch or args.serve:
+            if args.source or args.input:
+                parser.error('--source and --input cannot be used with --batch or --serve.')
+            if profiled:
+                parser.error('Profiling cannot be used with --batch or --serve.')
+        elif not (args.source or args.input):
+            parser.error('Add -source or -input. See --help for more info.')
+        elif args.timeout is not None:
+            parser.error('--timeout can only be used with --batch or --serve.')
+        if args.jobs != 1 and not args.batch:
+            parser.error('--jobs can only be used with --batch.')
+        if args.max_instructions is not None and not args.serve:
+            parser.error('--max-instructions can only be used with --serve.')
+        if args.quantum is not None:
+            if not args.batch or args.jobs != 1:
+                parser.error('--quantum can only be used with --batch without --jobs.')
+            if args.quantum < 1:
+                parser.error('--quantum must be positive.')
+            if args.engine == 'codegen':
+                parser.error('--quantum is not supported by the codegen engine.')
+        if args.jobs < 0:
+            parser.error('--jobs must not be negative.')
+        if profiled and args.engine == 'codegen':
+            parser.error('Profiling is not supported by the codegen engine.')
+        if args.serve and args.engine == 'codegen':
+            parser.error('--serve is not supported by the codegen engine.')
+        return args
+
+    @staticmethod
+    def argument_parser():
+        """
+        :return: Parser of the console arguments, its defaults are the defaults of the library API as well.
+        """
+        parser = argparse.ArgumentParser(description='Add path to source or input. At least one has to be set.')
+        parser.add_argument('--source')
+        parser.add_argument('--input')
+        parser.add_argument('--output-buffer', type=int, default=OUTPUT_BUFFER,
+                            help='number of output characters buffered before writing, 0 disables buffering')
+        parser.add_argument('--opt-level', type=int, default=0, choices=[0, 1, 2, 3],
+                            help='optimization level, 1 fuses common instruction sequences, '
+                                 '2 also removes type checks proven redundant, '
+                                 '3 also folds constants and removes unreachable code')
+        parser.add_argument('--opt-report', action='store_true', help='print the optimizer statistics to stderr')
+        parser.add_argument('--engine', default='reference', choices=['reference', 'closure', 'codegen'],
+                            help='execution engine, reference dispatches the instructions to the Interpret '
+                                 'methods, closure runs them compiled to Python closures, codegen runs the '
+                                 'basic blocks compiled to Python functions')
+        parser.add_argument('--cache-dir', help='directory of the compiled program cache, disabled if not set')
+        parser.add_argument('--cache-max-size', type=float, default=64, help='cache size limit in MiB')
+        parser.add_argument('--cache-max-age', type=float, default=30, help='cache entry age limit in days')
+        parser.add_argument('--profile', metavar='FILE',
+                            help='count and time the executed instructions and write the report to the file')
+        parser.add_argument('--profile-calls', metavar='FILE',
+                            help='write the instruction counts and times of the subroutines, by CALL label')
+        parser.add_argument('--profile-stacks', metavar='FILE',
+                            help='write the time of the call stacks in the collapsed format of flame graph tools')
+        parser.add_argument('--profile-format', default='table', choices=['table', 'json'],
+                            help='format of the profile reports')
+        parser.add_argument('--batch', metavar='PATH',
+                            help='run every program of a JSON manifest, or every .src file of a test directory '
+                                 'tree, in this process and compare the results with the expected ones')
+        parser.add_argument('--batch-report', metavar='FILE', help='write the results of the batch as JSON')
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='number of worker processes running the programs of the batch, 0 for all cores')
+        parser.add_argument('--timeout', type=float,
+                            help='wall time limit of every program of the batch or served request in seconds')
+        parser.add_argument('--serve', metavar='SOCKET',
+                            help='run the programs of the requests received on a Unix domain socket')
+        parser.add_argument('--max-instructions', type=int,
+                            help='limit of the instructions executed by a served request')
+        parser.add_argument('--quantum', type=int, nargs='?', const=QUANTUM,
+                            help=f'run the programs of the batch interleaved in one thread, each for the number '
+                                 f'of instructions at a time, {QUANTUM} if not given')
+        return parser
 
     def xml_parse(self):
         """
-        Parses the XML and sorts the instructions and arguments correctly.
+        Parses the XML as a stream. Each instruction is validated and compiled as soon as it is read and then
+        dropped from the tree, so the whole document is never held in memory. The instructions are sorted
+        by their order afterwards.
         """
+        self.instructions = []
+        orders = set()
+        error = None
+        root = None
+        depth = 0
         try:
-            tree = ET.parse(self.int_source)
-            self.root = tree.getroot()
-        except:
+            for event, elem in ET.iterparse(self.int_source, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                        error = self.program_validity(root)
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                # * after the first error the rest of the document is only checked for the XML format
+                if error is None:
+                    try:
+                        self.instructions.append(self.compile_instruction(elem, orders))
+                    except XMLStructureError as struct_error:
+                        error = struct_error.message
+                root.clear()
+        except (ET.ParseError, OSError):
             err("Invalid XML format.", ERR_INVALID_FORMAT)
-        # * checks needed before sorting
-        orders = []
-        for child in list(self.root):
-            if child.tag != 'instruction':
-                err("Invalid XML structure: 'instruction' expected.", ERR_INVALID_STRUCT)
-            try:
-                if (int(child.get('order')) < 1) or (int(child.get('order')) in orders):
-                    err("Invalid order.", ERR_INVALID_STRUCT)
-                orders.append(int(child.get('order')))
-            except:
-                err("Invalid order.", ERR_INVALID_STRUCT)
-        # * sort instructions based on "order" attribute
-        for child in self.root.iter():
+        if error is not None:
+            err(error, ERR_INVALID_STRUCT)
+        self.instructions.sort(key=attrgetter('order'))
+        self.assign_slots()
+
+    def program_validity(self, root):
+        """
+        Checks the validity of the 'program' tag.
+        :param root: Root element.
+        :return: Error message or None if valid.
+        """
+        if root.tag != 'program':
+            return "The 'program' tag is missing."
+        if not all(item in ['language', 'name', 'description'] for item in root.attrib):
+            return "Invalid attributes in 'program'."
+        if ('language' not in root.attrib) or (root.attrib['language'] != 'IPPcode21'):
+            return "Attribute 'language' in 'program missing or invalid."
+        return None
+
+    def compile_instruction(self, child, orders):
+        """
+        Checks the validity of an instruction element and compiles it into the instruction record.
+        :param child: Instruction element.
+        :param orders: Orders of the already read instructions.
+        :return: Instruction record.
+        """
+        if child.tag != 'instruction':
+            raise XMLStructureError("Invalid XML structure: 'instruction' expected.")
+        try:
+            order = int(child.get('order'))
+        except (TypeError, ValueError):
+            raise XMLStructureError("Invalid order.")
+        if order < 1 or order in orders:
+            raise XMLStructureError("Invalid order.")
+        orders.add(order)
+        if not all(item in ['opcode', 'order'] for item in child.attrib):
+            raise XMLStructureError("Invalid attributes in 'instruction'.")
+        if 'opcode' not in child.attrib:
+            raise XMLStructureError("Missing 'instruction' attribute 'order' or 'opcode'.")
+        opcode = child.get("opcode").upper()
+        if opcode not in self.instruction_dict:
+            raise XMLStructureError("Invalid instruction opcode.")
+        args_current = []
+        args = []
+        # * check instruction childern (args)
+        argnum = 1
+        for arg in sorted(child, key=attrgetter("tag")):
+            if arg.tag != ('arg' + str(argnum)):  # * invalid tag name in args
+                raise XMLStructureError("Invalid tags.")
+            if (len(arg.attrib) != 1) or ('type' not in arg.attrib):
+                raise XMLStructureError("Invalid 'arg' attributes.")
+            type_attr = arg.get('type')
+            valid_type_attr = ['int', 'bool', 'string', 'nil', 'label', 'type', 'var']
+            if (type_attr is None) or (type_attr not in valid_type_attr):  # * invalid type attribute in arg tags
+                raise XMLStructureError("Invalid 'arg' attributes.")
+            # * check text validity
+            text_valid = value_validity(type_attr, arg.text)
+            if not text_valid:
+                raise XMLStructureError("Invalid text inside an argument.")
+            args.append(Argument(type_attr, arg.text if arg.text is not None else ''))
+            # * change type attribute in case of symb
+            if type_attr in ['string', 'int', 'nil', 'bool']:
+                type_attr = 'symb'
             try:
-                self.root[:] = sorted(self.root.findall('instruction'), key=lambda child: int(child.get('order')))
-            except:
-                err("Invalid order.", ERR_INVALID_STRUCT)
-        # * sort arguments
-        for node in self.root.findall("*"):
-            node[:] = sorted(node, key=attrgetter("tag"))
-
-    def xml_validity(self):
-        """
-        Checks the validity of the source XML.
-        """
-        # * check program tag validity
-        if self.root.tag != 'program':
-            err("The 'program' tag is missing.", ERR_INVALID_STRUCT)
-        if not all(item in ['language', 'name', 'description'] for item in self.root.attrib):
-            err("Invalid attributes in 'program'.", ERR_INVALID_STRUCT)
-        if ('language' not in self.root.attrib) or (self.root.attrib['language'] != 'IPPcode21'):
-            err("Attribute 'language' in 'program missing or invalid.", ERR_INVALID_STRUCT)
-        # * check instruction tag validity
-        for child in self.root.findall('instruction'):
-            if not all(item in ['opcode', 'order'] for item in child.attrib):
-                err(f"Invalid attributes in 'instruction'.", ERR_INVALID_STRUCT)
-            if ('opcode' not in child.attrib) or ('order' not in child.attrib):
-                err("Missing 'instruction' attribute 'order' or 'opcode'.", ERR_INVALID_STRUCT)
-            opcode = child.get("opcode").upper()
-            if opcode not in self.instruction_dict:
-                err("Invalid instruction opcode.", ERR_INVALID_STRUCT)
-            args_current = []
-            # * check instruction childern (args)
-            argnum = 1
-            for arg in list(child):
-                if arg.tag != ('arg' + str(argnum)):  # * invalid tag name in args
-                    err("Invalid tags.", ERR_INVALID_STRUCT)
-                if (len(arg.attrib) != 1) or ('type' not in arg.attrib):
-                    err("Invalid 'arg' attributes.", ERR_INVALID_STRUCT)
-                type_attr = arg.get('type')
-                valid_type_attr = ['int', 'bool', 'string', 'nil', 'label', 'type', 'var']
-                if (type_attr is None) or (type_attr not in valid_type_attr):  # * invalid type attribute in arg tags
-                    err("Invalid 'arg' attributes.", ERR_INVALID_STRUCT)
-                # * check text validity
-                text_valid = value_validity(type_attr, arg.text)
-                if not text_valid:
-                    err("Invalid text inside an argument.", ERR_INVALID_STRUCT)
-                # * change type attribute in case of symb
-                if type_attr in ['string', 'int', 'nil', 'bool']:
+                if type_attr == 'var' and self.instruction_dict[opcode][argnum - 1] == 'symb':
                     type_attr = 'symb'
-                try:
-                    if type_attr == 'var' and self.instruction_dict[opcode][argnum - 1] == 'symb':
-                        type_attr = 'symb'
-                except:
-                    err("Invalid arguments.", ERR_INVALID_STRUCT)
-                args_current.append(type_attr)
-                argnum += 1
-            if args_current != self.instruction_dict[opcode.upper()]:
-                err("Invalid 'instruction' arguments.", ERR_INVALID_STRUCT)
+            except (KeyError, IndexError):
+                raise XMLStructureError("Invalid arguments.")
+            args_current.append(type_attr)
+            argnum += 1
+        if args_current != self.instruction_dict[opcode]:
+            raise XMLStructureError("Invalid 'instruction' arguments.")
+        return Instruction(OPCODE_NUMBERS[opcode], order, tuple(args))
+
+    def assign_slots(self):
+        """
+        Global variables are known from DEFVAR, each gets a slot in the global frame.
+        """
+        self.gf_slots = {}
+        for instruction in self.instructions:
+            if instruction.opcode == OPCODE_NUMBERS['DEFVAR'] and instruction.args[0].frame == 'GF':
+                self.gf_slots.setdefault(instruction.args[0].name, len(self.gf_slots))
+        for instruction in self.instructions:
+            for arg in instruction.args:
+                if arg.frame == 'GF':
+                    arg.slot = self.gf_slots.get(arg.name)
+
+
+class Cell:
+    """
+    Value of a variable with its type. A variable gets its cell on the first assignment, the following
+    assignments overwrite the cell in place.
+    """
+    __slots__ = ('type', 'value')
+
+    def __init__(self, value_type, value):
+        self.type = value_type
+        self.value = value
+
+
+class StringBuffer:
+    """
+    Mutable string value created by SETCHAR and by CONCAT appending to its own first operand. The characters
+    are kept in a list, so appending is amortized O(1) per character and replacing a character is O(1).
+    The text is joined when the value is read by other instructions and kept until the next change.
+    """
+    __slots__ = ('chars', 'text')
+
+    def __init__(self, text):
+        self.chars = list(text)
+        self.text = text
+
+    def append(self, text):
+        """
+        :param text: Appended string.
+        """
+        self.chars.extend(text)
+        self.text = None
+
+    def replace(self, index, char):
+        """
+        :param index: Index of the replaced character.
+        :param char: New character.
+        """
+        self.chars[index] = char
+        self.text = None
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, index):
+        return self.chars[index]
+
+    def __str__(self):
+        if self.text is None:
+            self.text = ''.join(self.chars)
+        return self.text
+
+
+def append_string(target, text):
+    """
+    Appends the text to the value of the variable CONCAT stores to.
+    :param target: Current value, a string or a StringBuffer.
+    :param text: Appended string.
+    :return: StringBuffer holding the result.
+    """
+    buffer = target if target.__class__ is StringBuffer else StringBuffer(target)
+    buffer.append(text)
+    return buffer
+
+
+def creates_string_buffers(instructions):
+    """
+    :param instructions: List of instruction objects.
+    :return: True if any instruction may store a StringBuffer to a variable.
+    """
+    for instruction in instructions:
+        name = OPCODES[instruction.opcode]
+        if name == 'SETCHAR' or name in ['CONCAT', 'CONCAT_STRING'] and \
+                Optimizer.same_variable(instruction.args[0], instruction.args[1]):
+            return True
+    return False
 
 
 class Frame:
     """
-    A frame holding variables - temporary/local/global.
+    A frame holding variables - temporary/local.
     """
     def __init__(self):
         self.variables = {}
 
-    def define_variable(self, var_name):
+    def define_variable(self, var):
         """
         Create a variable in the frame.
-        :param var_name: Variable name.
+        :param var: Variable argument.
         """
-        if var_name in self.variables:
-            err(f"Variable '{var_name}' is already defined.", ERR_SEM)
-        self.variables[var_name] = None
+        if var.name in self.variables:
+            err(f"Variable '{var.name}' is already defined.", ERR_SEM)
+        self.variables[var.name] = None
 
-    def edit_variable(self, var_name, value, value_type):
+    def edit_variable(self, var, value, value_type):
         """
         Changes the value and possibly the type of the variable.
-        :param var_name: Variable name.
+        :param var: Variable argument.
+        :param value: New value.
+        :param value_type: New type.
+        """
+        value = self.convert_value(value, value_type)
+        if var.name not in self.variables:
+            err(f"Variable '{var.name}' does not exist.", ERR_VAR)
+        cell = self.variables[var.name]
+        if cell is None:
+            self.variables[var.name] = Cell(value_type, value)
+        else:
+            cell.type = value_type
+            cell.value = value
+
+    def get_var_value(self, var, geterr=True, materialize=True):
+        """
+        Gets the value of a variable defined in the frame.
+        :param var: Variable argument.
+        :param geterr: When true, an empty variable stops the script with an error.
+        :param materialize: When true, a StringBuffer value is returned as a string.
+        :return: Variable value and type or empty strings.
+        """
+        if var.name not in self.variables:
+            err(f"Variable '{var.name}' does not exist.", ERR_VAR)
+        value = self.variables[var.name]
+        if value is None:
+            if geterr:
+                err(f"The variable {var.name} has no value yet.", ERR_VALUE_MISSING)
+            else:
+                return '', ''
+        if materialize and value.value.__class__ is StringBuffer:
+            return str(value.value), value.type
+        return value.value, value.type
+
+    def as_dict(self):
+        """
+        :return: Dictionary of the defined variables.
+        """
+        return self.variables
+
+    @staticmethod
+    def convert_value(value, value_type):
+        """
+        Converts the value to the representation stored in frames.
         :param value: New value.
         :param value_type: New type.
+        :return: Converted value.
         """
         if value_type == 'int':
             try:
                 value = int(value)
-            except:
+            except (TypeError, ValueError):
                 err("Invalid int.", ERR_TYPES)
-        elif value_type == 'bool' and value != 'true' and value != 'false':
-            if value:
-                value = 'true'
-            elif not value:
-                value = 'false'
+        return value
+
+
+class GlobalFrame(Frame):
+    """
+    The global frame. Its variables are known from DEFVAR at load time, so they are stored in a list
+    indexed by the slot of the variable argument.
+    """
+    def __init__(self, slots):
+        self.slots = slots
+        self.variables = [UNDEFINED] * len(slots)
+
+    def define_variable(self, var):
+        """
+        Create a variable in the frame.
+        :param var: Variable argument.
+        """
+        if self.variables[var.slot] is not UNDEFINED:
+            err(f"Variable '{var.name}' is already defined.", ERR_SEM)
+        self.variables[var.slot] = None
 
-        if var_name not in self.variables:
-            err(f"Variable '{var_name}' does not exist.", ERR_VAR)
-        self.variables[var_name] = [value_type, value]
+    def edit_variable(self, var, value, value_type):
+        """
+        Changes the value and possibly the type of the variable.
+        :param var: Variable argument.
+        :param value: New value.
+        :param value_type: New type.
+        """
+        value = self.convert_value(value, value_type)
+        if var.slot is None or (cell := self.variables[var.slot]) is UNDEFINED:
+            err(f"Variable '{var.name}' does not exist.", ERR_VAR)
+        if cell is None:
+            self.variables[var.slot] = Cell(value_type, value)
+        else:
+            cell.type = value_type
+            cell.value = value
 
-    def get_var_value(self, var_name, geterr=True):
+    def get_var_value(self, var, geterr=True, materialize=True):
         """
         Gets the value of a variable defined in the frame.
-        :param var_name: Variable name.
+        :param var: Variable argument.
         :param geterr: When true, an empty variable stops the script with an error.
+        :param materialize: When true, a StringBuffer value is returned as a string.
         :return: Variable value and type or empty strings.
         """
-        if var_name not in self.variables:
-            err(f"Variable '{var_name}' does not exist.", ERR_VAR)
-        if self.variables[var_name] is None:
+        if var.slot is None or (value := self.variables[var.slot]) is UNDEFINED:
+            err(f"Variable '{var.name}' does not exist.", ERR_VAR)
+        if value is None:
             if geterr:
-                err(f"The variable {var_name} has no value yet.", ERR_VALUE_MISSING)
+                err(f"The variable {var.name} has no value yet.", ERR_VALUE_MISSING)
             else:
                 return '', ''
-        return self.variables[var_name][1], self.variables[var_name][0]
+        if materialize and value.value.__class__ is StringBuffer:
+            return str(value.value), value.type
+        return value.value, value.type
+
+    def as_dict(self):
+        """
+        :return: Dictionary of the defined variables.
+        """
+        return {name: self.variables[slot] for name, slot in self.slots.items()
+                if self.variables[slot] is not UNDEFINED}
 
 
 class Labels:
     """
-    Reads and stores the labels before starting the interpretation.
+    Reads and stores the labels and resolves the jump targets before starting the interpretation.
     """
-    labels_storage = {}
-
-    def __init__(self, xml_root):
-        instr_list = xml_root.findall('instruction')
-        for instruction in instr_list:
-            if instruction.get('opcode') == 'LABEL':
-                label_name = instruction[0].text
+    def __init__(self, instr_list):
+        self.labels_storage = {}
+        for index, instruction in enumerate(instr_list):
+            if instruction.opcode == OPCODE_NUMBERS['LABEL']:
+                label_name = instruction.args[0].text
                 if label_name in self.labels_storage:
                     err(f"Label {label_name} already exists.", ERR_SEM)
-                self.labels_storage[label_name] = instr_list.index(instruction)
+                self.labels_storage[label_name] = index
+        for instruction in instr_list:
+            self.resolve_target(instruction)
 
+    def resolve_target(self, instruction):
+        """
+        Sets the index of the jump target, fused instructions jump to the target of their last part.
+        :param instruction: Instruction object.
+        """
+        if instruction.parts is not None:
+            for part in instruction.parts:
+                self.resolve_target(part)
+            instruction.target = instruction.parts[-1].target
+        elif instruction.opcode in JUMP_OPCODES:
+            instruction.target = self.labels_storage.get(instruction.args[0].text)
 
-class Interpret:
+
+class CompiledProgramCache:
     """
-    The main class containing the instructions with their actions.
+    Cache of compiled programs, keyed by the hash of the source and the interpreter version.
+    The subclasses keep the entries on disk or in memory.
     """
-    GF = None
-    TF = None
-    LF_stack = []
-    LF = None
-    call_stack = []
-    data_stack = []
-    current = 0
-    label = None
-    prep = None
+    interpreter_digest = None
 
-    def __init__(self):
-        self.prep = Preparation()
-        self.GF = Frame()
-        self.label = Labels(self.prep.root)
-        instruction_list = self.prep.root.findall('instruction')
-        self.current = 0
-        while self.current < len(instruction_list):
-            self.call_instruction(instruction_list[self.current].get('opcode').upper(), instruction_list[self.current])
-            self.current += 1
-        self.prep.int_input.close()
+    def key(self, source):
+        """
+        Hashes the source together with the interpreter version.
+        :param source: Path to the source file or a stream holding the source.
+        :return: Hex digest or None if the source can not be read.
+        """
+        if CompiledProgramCache.interpreter_digest is None:
+            digest = hashlib.sha256(f'{VERSION}:{sys.version_info[0]}.{sys.version_info[1]}:'.encode())
+            with open(__file__, 'rb') as interpreter:
+                digest.update(interpreter.read())
+            # * hashed once per process, a batch computes the keys of many programs
+            CompiledProgramCache.interpreter_digest = digest
+        digest = CompiledProgramCache.interpreter_digest.copy()
+        if isinstance(source, io.BytesIO):
+            digest.update(source.getvalue())
+            return digest.hexdigest()
+        try:
+            with open(source, 'rb') as file:
+                while chunk := file.read(1 << 16):
+                    digest.update(chunk)
+        except (OSError, TypeError):
+            return None
+        return digest.hexdigest()
 
-    def call_instruction(self, name: str, instr):
+    def load(self, key):
         """
-        Dynamically calls the correct method based on the opcode of the current instruction.
-        :param name: Instruction name.
-        :param instr: Current instruction object.
+        Loads the compiled program.
+        :param key: Cache key.
+        :return: Instruction list and global frame slots, None if the entry is missing.
         """
-        if hasattr(self, name) and callable(instr_method := getattr(self, name)):
-            instr_method(instr)
+        raise NotImplementedError
 
-    def check_frame(self, frame_type):
+    def store(self, key, instructions, gf_slots):
         """
-        Checks if a frame exists.
-        :param frame_type: Temporary/local/global frame. TF/LF/GF/
+        Stores the compiled program.
+        :param key: Cache key.
+        :param instructions: Instruction list.
+        :param gf_slots: Global frame slots.
         """
-        if frame_type == 'LF':
-            if self.LF_stack:
-                self.LF = self.LF_stack[-1]
-            else:
-                err("Frame does not exist.", ERR_FRAME)
-        elif frame_type == 'TF':
-            if self.TF is None:
-                err("Frame does not exist.", ERR_FRAME)
+        raise NotImplementedError
 
-    def return_frame(self, instr, var_index):
-        """
-        Returns the frame object.
-        :param instr: Current instruction object.
-        :param var_index: Index of the considered instruction argument.
-        :return: Frame object, value after the '@'.
-        """
-        var = instr[var_index].text.split('@', 1)
-        self.check_frame(var[0])
-        current_frame = getattr(self, var[0])
-        if not var[1]:
-            var[1] = ''
-        return current_frame, var[1]
 
-    def resolve_symb(self, instr, symb_index, geterr=True):
+class ProgramCache(CompiledProgramCache):
+    """
+    On-disk cache of compiled programs.
+    """
+    MAGIC = b'IPPC'
+
+    def __init__(self, directory, max_size, max_age):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def path(self, key):
         """
-        Get the value of symbol, which is either a constant or a variable.
-        :param instr: Current instruction object.
-        :param symb_index: Index of the considered instruction argument.
-        :param geterr: If True, throws an exception in case of an empty variable.
-        :return: Symbol value and type.
+        :param key: Cache key.
+        :return: Path to the cache entry.
         """
-        symb_type = instr[symb_index].get('type')
-        symb_val = None
-        if symb_type == 'var':
-            current_frame, var_name = self.return_frame(instr, symb_index)
-            symb_val, symb_type = current_frame.get_var_value(var_name, geterr)
-        elif symb_type == 'int':
-            symb_val = int(instr[symb_index].text)
-        elif symb_type == 'string':
-            if instr[symb_index].text:
-                symb_val = self.replace_sequences(instr[symb_index].text)
-            else:
-                symb_val = ''
-        else:
-            symb_val = instr[symb_index].text
-        return symb_val, symb_type
+        return os.path.join(self.directory, key + '.ippc')
 
-    def replace_sequences(self, value):
+    def load(self, key):
         """
-        Replaces the escape sequences with corresponding characters.
-        :param value: String to convert.
-        :return: Converted string.
+        Loads the compiled program.
+        :param key: Cache key.
+        :return: Instruction list and global frame slots, None if the entry is missing or unreadable.
         """
-        matches = re.findall(r'\\[0-9]{3}', value)
-        for val in matches:
+        if key is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        try:
+            if not data.startswith(self.MAGIC):
+                raise ValueError('Invalid cache entry header.')
+            instructions, gf_slots = marshal.loads(data[len(self.MAGIC):])
+            return [Instruction.from_tuple(values) for values in instructions], gf_slots
+        except (EOFError, ValueError, TypeError):
+            # * a truncated or stale entry is a miss, it is replaced when the program is stored again
             try:
-                char = chr(int(val[2:]))
-            except:
-                err("Error converting the escape sequence.", ERR_STRING)
-            value = value.replace(val, char)
-        return value
+                os.remove(path)
+            except OSError:
+                pass
+            return None
 
-    def bool_ipp_to_py(self, value):
+    def store(self, key, instructions, gf_slots):
         """
-        Changes the IPPcode21 boolean to Python boolean.
-        :param value: IPPcode21 boolean.
-        :return: Corresponding Python boolean.
+        Stores the compiled program and evicts old entries. Failures are ignored, the cache is optional.
+        :param key: Cache key.
+        :param instructions: Instruction list.
+        :param gf_slots: Global frame slots.
         """
-        if value == 'true':
-            return True
-        if value == 'false':
-            return False
+        data = self.MAGIC + marshal.dumps(([instr.to_tuple() for instr in instructions], gf_slots))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, self.path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes entries older than the age limit, then the least recently used ones above the size limit.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.ippc'):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        entries.sort(reverse=True)
+        now = time.time()
+        total = 0
+        for mtime, size, path in entries:
+            total += size
+            if now - mtime > self.max_age or total > self.max_size:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
 
-    def bool_py_to_ipp(self, value):
+class ProgramMemoryCache(CompiledProgramCache):
+    """
+    In-memory cache of compiled programs of a long-running server, holding the most recently used entries.
+    Programs are stored as plain tuples, so every load builds new instruction objects.
+    """
+    def __init__(self, max_entries):
+        import threading
+        self.entries = {}
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        """
+        Loads the compiled program.
+        :param key: Cache key.
+        :return: Instruction list and global frame slots, None if the entry is missing.
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            self.entries[key] = entry
+        instructions, gf_slots = entry
+        return [Instruction.from_tuple(values) for values in instructions], dict(gf_slots)
+
+    def store(self, key, instructions, gf_slots):
         """
-        Changes the Python boolean to IPPcode21 boolean.
-        :param value: Python boolean.
-        :return: Corresponding IPPcode21 boolean.
+        Stores the compiled program and evicts the least recently used entries above the limit.
+        :param key: Cache key.
+        :param instructions: Instruction list.
+        :param gf_slots: Global frame slots.
+        """
+        if key is None:
+            return
+        entry = (tuple(instruction.to_tuple() for instruction in instructions), dict(gf_slots))
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+
+class BasicBlock:
+    """
+    Instructions from start to end (exclusive) that are always executed in sequence.
+    """
+    __slots__ = ('start', 'end', 'successors', 'return_site')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.successors = []
+        self.return_site = False
+
+
+class Optimizer:
+    """
+    Optional optimization of the compiled program, run between Preparation and the interpretation.
+    Level 1 fuses common instruction sequences into single superinstructions, level 2 also replaces
+    instructions whose operand types are proven by the type inference with variants without type checks,
+    level 3 first folds the operations on constants and removes the unreachable instructions.
+    """
+    def __init__(self, instructions, level):
+        self.instructions = instructions
+        self.level = level
+        self.stats = {'fusions': 0, 'specializations': 0, 'folds': 0, 'removals': 0}
+
+    def run(self):
+        """
+        Runs the passes enabled by the optimization level and resolves the jump targets again.
+        :return: Optimized instruction list.
+        """
+        if self.level >= 3:
+            self.fold_constants()
+            self.eliminate_dead_code()
+        if self.level >= 1:
+            self.peephole()
+        Labels(self.instructions)
+        if self.level >= 2:
+            self.specialize_types()
+        return self.instructions
+
+    def report(self):
+        """
+        :return: Text summary of the applied optimizations.
+        """
+        return f"Optimizer (level {self.level}): {self.stats['fusions']} fusions applied, " \
+               f"{self.stats['specializations']} instructions specialized, {self.stats['folds']} folded, " \
+               f"{self.stats['removals']} removed.\n"
+
+    def basic_blocks(self):
+        """
+        Splits the instructions into basic blocks at labels and after jumps, calls, returns and exits.
+        :return: List of basic blocks with their successors.
+        """
+        leaders = {0}
+        for index, instruction in enumerate(self.instructions):
+            if instruction.opcode == OPCODE_NUMBERS['LABEL']:
+                leaders.add(index)
+            elif instruction.opcode in BLOCK_ENDS:
+                leaders.add(index + 1)
+        starts = sorted(leader for leader in leaders if leader < len(self.instructions))
+        blocks = [BasicBlock(start, end) for start, end in zip(starts, starts[1:] + [len(self.instructions)])]
+        block_at = {block.start: number for number, block in enumerate(blocks)}
+        for number, block in enumerate(blocks):
+            last = self.instructions[block.end - 1]
+            following = number + 1 if number + 1 < len(blocks) else None
+            if last.opcode in JUMP_OPCODES | CONDITIONAL_JUMPS and last.target is not None:
+                block.successors.append(block_at[last.target])
+            if last.opcode in [OPCODE_NUMBERS['JUMP'], OPCODE_NUMBERS['RETURN'], OPCODE_NUMBERS['EXIT']]:
+                continue
+            if following is not None:
+                block.successors.append(following)
+                # * the instruction after CALL is reached by RETURN from anywhere
+                blocks[following].return_site = last.opcode == OPCODE_NUMBERS['CALL']
+        return blocks
+
+    @staticmethod
+    def symbol_type(arg, state):
+        """
+        :param arg: Symbol argument.
+        :param state: Known variable types.
+        :return: Type of the symbol or None if unknown.
+        """
+        if arg.type == 'var':
+            return state.get((arg.frame, arg.name))
+        return arg.type
+
+    @staticmethod
+    def types_match(requirement, t1, t2):
+        """
+        Checks the operand types against the requirement of a typed variant.
+        :param requirement: Type both operands must have, 'same' for any equal types, 'ordered' for
+        equal types other than nil or a pair of types.
+        :param t1: Type of the first operand.
+        :param t2: Type of the second operand.
+        :return: True if the variant can be used.
+        """
+        if isinstance(requirement, tuple):
+            return (t1, t2) == requirement
+        if t1 is None or t1 != t2:
+            return False
+        if requirement == 'same':
+            return True
+        if requirement == 'ordered':
+            return t1 != 'nil'
+        return t1 == requirement
+
+    def transfer(self, instruction, state):
+        """
+        Updates the known variable types after the instruction.
+        :param instruction: Instruction object.
+        :param state: Known variable types, keyed by the frame and the name.
+        """
+        name = OPCODES[instruction.opcode]
+        args = instruction.args
+        if name in ['CREATEFRAME', 'PUSHFRAME', 'POPFRAME']:
+            frames = ['TF'] if name == 'CREATEFRAME' else ['TF', 'LF']
+            for key in [key for key in state if key[0] in frames]:
+                del state[key]
+            return
+        if name == 'STACK_OPERATION':
+            dest, result = args[2], OPERATION_TYPES.get(instruction.operation)
+        elif name == 'MOVE':
+            dest, result = args[0], self.symbol_type(args[1], state)
+        elif name in RESULT_TYPES:
+            dest, result = args[0], RESULT_TYPES[name]
+        elif name in ['READ', 'POPS', 'DEFVAR']:
+            dest, result = args[0], None
+        else:
+            return
+        if result is None:
+            state.pop((dest.frame, dest.name), None)
+        else:
+            state[(dest.frame, dest.name)] = result
+
+    def infer_types(self, blocks):
+        """
+        Forward dataflow analysis of the variable types known at the entry of each block.
+        :param blocks: Basic blocks.
+        :return: List of the entry states, None for unreachable blocks.
+        """
+        entries = [None] * len(blocks)
+        entries[0] = {}
+        worklist = [0]
+        while worklist:
+            number = worklist.pop()
+            state = dict(entries[number])
+            for instruction in self.instructions[blocks[number].start:blocks[number].end]:
+                self.transfer(instruction, state)
+            for successor in blocks[number].successors:
+                if blocks[successor].return_site:
+                    merged = {}
+                elif entries[successor] is None:
+                    merged = state
+                else:
+                    merged = {key: value for key, value in entries[successor].items() if state.get(key) == value}
+                if merged != entries[successor]:
+                    entries[successor] = dict(merged)
+                    worklist.append(successor)
+        return entries
+
+    def specialize_types(self):
+        """
+        Replaces the instructions with proven operand types by their variants without the type checks.
+        """
+        if not self.instructions:
+            return
+        blocks = self.basic_blocks()
+        for block, entry in zip(blocks, self.infer_types(blocks)):
+            if entry is None:
+                continue
+            state = dict(entry)
+            for instruction in self.instructions[block.start:block.end]:
+                self.specialize(instruction, state)
+                self.transfer(instruction, state)
+
+    def specialize(self, instruction, state):
+        """
+        Replaces the instruction or the operation of a fused instruction by its typed variant.
+        :param instruction: Instruction object.
+        :param state: Known variable types before the instruction.
+        """
+        name = OPCODES[instruction.opcode]
+        args = instruction.args
+        if instruction.operation is not None:
+            first = 0 if name == 'STACK_OPERATION' else 1
+            requirement, typed = TYPED_OPERATIONS.get(instruction.operation, (None, None))
+            t1 = self.symbol_type(args[first], state)
+            t2 = self.symbol_type(args[first + 1], state)
+        elif name in TYPED_INSTRUCTIONS:
+            requirement, typed = TYPED_INSTRUCTIONS[name]
+            t1 = self.symbol_type(args[1], state)
+            t2 = self.symbol_type(args[2], state) if len(args) > 2 else t1
+        else:
+            return
+        if requirement is None or not self.types_match(requirement, t1, t2):
+            return
+        if instruction.operation is not None:
+            instruction.operation = typed
+        else:
+            instruction.opcode = OPCODE_NUMBERS[typed]
+        self.stats['specializations'] += 1
+
+    def fold_constants(self):
+        """
+        Propagates the constants stored by MOVE to the following instructions of the same basic block,
+        replaces the operations on constants by MOVE of the result and the conditional jumps on constants
+        by JUMP or nothing. Operations that would fail at runtime are left for the interpretation to report.
+        """
+        if not self.instructions:
+            return
+        dropped = set()
+        for block in self.basic_blocks():
+            constants = {}
+            for index in range(block.start, block.end):
+                instruction = self.propagate(self.instructions[index], constants)
+                folded = self.fold(instruction)
+                if folded is not instruction:
+                    self.stats['folds'] += 1
+                    if folded is None:
+                        dropped.add(index)
+                        continue
+                    instruction = folded
+                self.instructions[index] = instruction
+                self.record_constant(instruction, constants)
+        if dropped:
+            self.instructions = [instruction for index, instruction in enumerate(self.instructions)
+                                 if index not in dropped]
+            Labels(self.instructions)
+
+    @staticmethod
+    def propagate(instruction, constants):
+        """
+        Replaces the variables read by the instruction with their known constant values.
+        :param instruction: Instruction object.
+        :param constants: Known constants, keyed by the frame and the name of the variable.
+        :return: The instruction or its copy with the replaced arguments.
+        """
+        first = 0 if OPCODES[instruction.opcode] in READ_ONLY_INSTRUCTIONS else 1
+        args = list(instruction.args)
+        for index in range(first, len(args)):
+            if args[index].type == 'var':
+                args[index] = constants.get((args[index].frame, args[index].name), args[index])
+        if args == list(instruction.args):
+            return instruction
+        replaced = Instruction(instruction.opcode, instruction.order, tuple(args))
+        replaced.target = instruction.target
+        return replaced
+
+    def fold(self, instruction):
+        """
+        Evaluates the instruction if all its operands are constants and it can not fail.
+        :param instruction: Instruction object.
+        :return: The instruction, its replacement or None if it has no effect.
+        """
+        name = OPCODES[instruction.opcode]
+        args = instruction.args
+        if name not in FOLDED_OPERATIONS and name not in ['JUMPIFEQ', 'JUMPIFNEQ']:
+            return instruction
+        operands = args[1:]
+        if any(operand.type == 'var' for operand in operands):
+            return instruction
+        requirement, _ = TYPED_INSTRUCTIONS[name]
+        t2 = operands[1].type if len(operands) > 1 else operands[0].type
+        if not self.types_match(requirement, operands[0].type, t2):
+            return instruction
+        v1 = operands[0].value
+        v2 = operands[1].value if len(operands) > 1 else None
+        if name in ['JUMPIFEQ', 'JUMPIFNEQ']:
+            if instruction.target is None:
+                return instruction
+            if (v1 == v2) != (name == 'JUMPIFEQ'):
+                return None
+            jump = Instruction(OPCODE_NUMBERS['JUMP'], instruction.order, args[:1])
+            jump.target = instruction.target
+            return jump
+        if name == 'IDIV' and v2 == 0:
+            return instruction
+        value, value_type = FOLDED_OPERATIONS[name](v1, None, v2, None)
+        constant = Argument.constant(value_type, Frame.convert_value(value, value_type))
+        return Instruction(OPCODE_NUMBERS['MOVE'], instruction.order, (args[0], constant))
+
+    @staticmethod
+    def record_constant(instruction, constants):
+        """
+        Updates the known constants after the instruction.
+        :param instruction: Instruction object.
+        :param constants: Known constants, keyed by the frame and the name of the variable.
+        """
+        name = OPCODES[instruction.opcode]
+        args = instruction.args
+        if name in ['CREATEFRAME', 'PUSHFRAME', 'POPFRAME']:
+            for key in [key for key in constants if key[0] in ['TF', 'LF']]:
+                del constants[key]
+        if not args or args[0].type != 'var' or name in READ_ONLY_INSTRUCTIONS:
+            return
+        key = (args[0].frame, args[0].name)
+        if name == 'MOVE' and args[1].type != 'var':
+            constants[key] = args[1]
+        else:
+            constants.pop(key, None)
+
+    def eliminate_dead_code(self):
+        """
+        Removes the basic blocks not reachable from the start of the program.
+        """
+        if not self.instructions:
+            return
+        blocks = self.basic_blocks()
+        reachable = {0}
+        worklist = [0]
+        while worklist:
+            for successor in blocks[worklist.pop()].successors:
+                if successor not in reachable:
+                    reachable.add(successor)
+                    worklist.append(successor)
+        if len(reachable) == len(blocks):
+            return
+        kept = []
+        for number, block in enumerate(blocks):
+            if number in reachable:
+                kept.extend(self.instructions[block.start:block.end])
+        self.stats['removals'] += len(self.instructions) - len(kept)
+        self.instructions = kept
+        Labels(self.instructions)
+
+    def peephole(self):
+        """
+        Replaces the recognized instruction sequences with fused instructions.
+        """
+        result = []
+        index = 0
+        while index < len(self.instructions):
+            fused = self.fuse_compare_jump(index) or self.fuse_stack_operation(index)
+            if fused is not None:
+                result.append(fused)
+                index += len(fused.parts)
+                self.stats['fusions'] += 1
+            else:
+                result.append(self.instructions[index])
+                index += 1
+        self.instructions = result
+
+    def sequence(self, index, opcodes):
+        """
+        Returns the instructions starting at the index if their opcodes match.
+        :param index: Index of the first instruction.
+        :param opcodes: Allowed opcode names for each instruction of the sequence.
+        :return: List of instructions or None.
+        """
+        parts = self.instructions[index:index + len(opcodes)]
+        if len(parts) != len(opcodes):
+            return None
+        for part, allowed in zip(parts, opcodes):
+            if OPCODES[part.opcode] not in allowed:
+                return None
+        return parts
+
+    @staticmethod
+    def same_variable(arg1, arg2):
+        """
+        :return: True if both arguments are the same variable.
+        """
+        return arg1.type == 'var' and arg2.type == 'var' and arg1.frame == arg2.frame and arg1.name == arg2.name
+
+    def fuse_compare_jump(self, index):
+        """
+        LT/GT/EQ var s1 s2 followed by JUMPIFEQ/JUMPIFNEQ label var bool@value (in any argument order).
+        :param index: Index of the first instruction.
+        :return: Fused instruction or None.
+        """
+        parts = self.sequence(index, [['LT', 'GT', 'EQ'], ['JUMPIFEQ', 'JUMPIFNEQ']])
+        if parts is None:
+            return None
+        compare, jump = parts
+        result = compare.args[0]
+        if self.same_variable(result, jump.args[1]) and jump.args[2].type == 'bool':
+            constant = jump.args[2]
+        elif self.same_variable(result, jump.args[2]) and jump.args[1].type == 'bool':
+            constant = jump.args[1]
+        else:
+            return None
+        jump_when = constant.value == (OPCODES[jump.opcode] == 'JUMPIFEQ')
+        opcode = 'COMPARE_JUMP_TRUE' if jump_when else 'COMPARE_JUMP_FALSE'
+        fused = Instruction(OPCODE_NUMBERS[opcode], compare.order, compare.args)
+        fused.parts = (compare, jump)
+        fused.operation = COMPARISONS[compare.opcode]
+        return fused
+
+    def fuse_stack_operation(self, index):
+        """
+        PUSHS s1, PUSHS s2, a binary stack operation and POPS var.
+        :param index: Index of the first instruction.
+        :return: Fused instruction or None.
+        """
+        parts = self.sequence(index, [['PUSHS'], ['PUSHS'], [OPCODES[opcode] for opcode in STACK_OPERATIONS],
+                                      ['POPS']])
+        if parts is None:
+            return None
+        push1, push2, operation, pop = parts
+        fused = Instruction(OPCODE_NUMBERS['STACK_OPERATION'], push1.order,
+                            (push1.args[0], push2.args[0], pop.args[0]))
+        fused.parts = tuple(parts)
+        fused.operation = STACK_OPERATIONS[operation.opcode]
+        return fused
+
+
+class Output:
+    """
+    Buffered writer of the program output. The texts are collected and written in a single call once
+    their size reaches the threshold and when the program ends.
+    """
+    def __init__(self, stream, threshold=OUTPUT_BUFFER):
+        self.stream = stream
+        self.threshold = threshold
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        """
+        Adds the text to the buffer.
+        :param text: Text to write.
+        """
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.threshold:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered texts to the stream.
+        """
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts.clear()
+            self.size = 0
+        self.stream.flush()
+
+
+"""
+Operations shared by the stack and the fused instructions. Each takes two values with their types,
+checks the types and returns the result value and type.
+"""
+
+
+def op_add(v1, v1_t, v2, v2_t):
+    """
+    ADD operation.
+    """
+    if v1_t != 'int' or v2_t != 'int':
+        err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
+    return v1 + v2, 'int'
+
+
+def op_sub(v1, v1_t, v2, v2_t):
+    """
+    SUB operation.
+    """
+    if v1_t != 'int' or v2_t != 'int':
+        err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
+    return v1 - v2, 'int'
+
+
+def op_mul(v1, v1_t, v2, v2_t):
+    """
+    MUL operation.
+    """
+    if v1_t != 'int' or v2_t != 'int':
+        err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
+    return v1 * v2, 'int'
+
+
+def op_idiv(v1, v1_t, v2, v2_t):
+    """
+    IDIV operation.
+    """
+    if v1_t != 'int' or v2_t != 'int':
+        err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
+    if v2 == 0:
+        err("Division by zero.", ERR_VALUE_WRONG)
+    return v1 // v2, 'int'
+
+
+def op_lt(v1, v1_t, v2, v2_t):
+    """
+    LT operation.
+    """
+    if v1_t == 'nil' or v2_t == 'nil':
+        err("Comparison with nil.", ERR_TYPES)
+    if v1_t != v2_t:
+        err("Comparing values of two different types.", ERR_TYPES)
+    return v1 < v2, 'bool'
+
+
+def op_gt(v1, v1_t, v2, v2_t):
+    """
+    GT operation.
+    """
+    if v1_t == 'nil' or v2_t == 'nil':
+        err("Comparison with nil.", ERR_TYPES)
+    if v1_t != v2_t:
+        err("Comparing values of two different types.", ERR_TYPES)
+    return v1 > v2, 'bool'
+
+
+def op_eq(v1, v1_t, v2, v2_t):
+    """
+    EQ operation.
+    """
+    if v1_t == 'nil' or v2_t == 'nil':
+        return v1_t == v2_t, 'bool'
+    if v1_t != v2_t:
+        err("Comparing values of two different types.", ERR_TYPES)
+    return v1 == v2, 'bool'
+
+
+def op_and(v1, v1_t, v2, v2_t):
+    """
+    AND operation.
+    """
+    if v1_t != 'bool' or v2_t != 'bool':
+        err("Logical operators only accept bool values.", ERR_TYPES)
+    return v1 and v2, 'bool'
+
+
+def op_or(v1, v1_t, v2, v2_t):
+    """
+    OR operation.
+    """
+    if v1_t != 'bool' or v2_t != 'bool':
+        err("Logical operators only accept bool values.", ERR_TYPES)
+    return v1 or v2, 'bool'
+
+
+"""
+Variants of the operations for operand types proven by the Optimizer, they skip the type checks.
+"""
+
+
+def op_add_int(v1, _, v2, __):
+    """
+    ADD operation on two ints.
+    """
+    return v1 + v2, 'int'
+
+
+def op_sub_int(v1, _, v2, __):
+    """
+    SUB operation on two ints.
+    """
+    return v1 - v2, 'int'
+
+
+def op_mul_int(v1, _, v2, __):
+    """
+    MUL operation on two ints.
+    """
+    return v1 * v2, 'int'
+
+
+def op_idiv_int(v1, _, v2, __):
+    """
+    IDIV operation on two ints.
+    """
+    if v2 == 0:
+        err("Division by zero.", ERR_VALUE_WRONG)
+    return v1 // v2, 'int'
+
+
+def op_lt_typed(v1, _, v2, __):
+    """
+    LT operation on two values of the same type other than nil.
+    """
+    return v1 < v2, 'bool'
+
+
+def op_gt_typed(v1, _, v2, __):
+    """
+    GT operation on two values of the same type other than nil.
+    """
+    return v1 > v2, 'bool'
+
+
+def op_eq_typed(v1, _, v2, __):
+    """
+    EQ operation on two values of the same type.
+    """
+    return v1 == v2, 'bool'
+
+
+def op_and_bool(v1, _, v2, __):
+    """
+    AND operation on two bools.
+    """
+    return v1 and v2, 'bool'
+
+
+def op_or_bool(v1, _, v2, __):
+    """
+    OR operation on two bools.
+    """
+    return v1 or v2, 'bool'
+
+
+def op_not_bool(v1, _, __, ___):
+    """
+    NOT operation on a bool.
+    """
+    return not v1, 'bool'
+
+
+def op_concat_string(v1, _, v2, __):
+    """
+    CONCAT operation on two strings.
+    """
+    return v1 + v2, 'string'
+
+
+def op_strlen_string(v1, _, __, ___):
+    """
+    STRLEN operation on a string.
+    """
+    return len(v1), 'int'
+
+
+"""
+Operations of the comparison and the binary stack instructions, indexed by the opcode number.
+"""
+COMPARISONS = {OPCODE_NUMBERS['LT']: op_lt, OPCODE_NUMBERS['GT']: op_gt, OPCODE_NUMBERS['EQ']: op_eq}
+STACK_OPERATIONS = {
+    OPCODE_NUMBERS['ADDS']: op_add, OPCODE_NUMBERS['SUBS']: op_sub, OPCODE_NUMBERS['MULS']: op_mul,
+    OPCODE_NUMBERS['IDIVS']: op_idiv, OPCODE_NUMBERS['LTS']: op_lt, OPCODE_NUMBERS['GTS']: op_gt,
+    OPCODE_NUMBERS['EQS']: op_eq, OPCODE_NUMBERS['ANDS']: op_and, OPCODE_NUMBERS['ORS']: op_or
+}
+
+
+"""
+Typed variants of the operations with the operand types they require, see Optimizer.types_match.
+"""
+TYPED_OPERATIONS = {
+    op_add: ('int', op_add_int), op_sub: ('int', op_sub_int), op_mul: ('int', op_mul_int),
+    op_idiv: ('int', op_idiv_int), op_lt: ('ordered', op_lt_typed), op_gt: ('ordered', op_gt_typed),
+    op_eq: ('same', op_eq_typed), op_and: ('bool', op_and_bool), op_or: ('bool', op_or_bool)
+}
+OPERATION_TYPES = {operation: 'int' if requirement == 'int' else 'bool'
+                   for operation, (requirement, _) in TYPED_OPERATIONS.items()}
+OPERATION_TYPES.update({typed: OPERATION_TYPES[operation] for operation, (_, typed) in TYPED_OPERATIONS.items()})
+
+"""
+Typed variants of the instructions with the operand types they require, see Optimizer.types_match.
+"""
+TYPED_INSTRUCTIONS = {
+    'ADD': ('int', 'ADD_INT'), 'SUB': ('int', 'SUB_INT'), 'MUL': ('int', 'MUL_INT'), 'IDIV': ('int', 'IDIV_INT'),
+    'LT': ('ordered', 'LT_TYPED'), 'GT': ('ordered', 'GT_TYPED'), 'EQ': ('same', 'EQ_TYPED'),
+    'AND': ('bool', 'AND_BOOL'), 'OR': ('bool', 'OR_BOOL'), 'NOT': ('bool', 'NOT_BOOL'),
+    'CONCAT': ('string', 'CONCAT_STRING'), 'STRLEN': ('string', 'STRLEN_STRING'),
+    'GETCHAR': (('string', 'int'), 'GETCHAR_TYPED'), 'JUMPIFEQ': ('same', 'JUMPIFEQ_TYPED'),
+    'JUMPIFNEQ': ('same', 'JUMPIFNEQ_TYPED')
+}
+
+"""
+Types of the values the instructions store to their first argument.
+"""
+RESULT_TYPES = {
+    'ADD': 'int', 'SUB': 'int', 'MUL': 'int', 'IDIV': 'int', 'LT': 'bool', 'GT': 'bool', 'EQ': 'bool',
+    'AND': 'bool', 'OR': 'bool', 'NOT': 'bool', 'INT2CHAR': 'string', 'STRI2INT': 'int', 'CONCAT': 'string',
+    'STRLEN': 'int', 'GETCHAR': 'string', 'SETCHAR': 'string', 'TYPE': 'string', 'COMPARE_JUMP_TRUE': 'bool',
+    'COMPARE_JUMP_FALSE': 'bool'
+}
+RESULT_TYPES.update({typed: RESULT_TYPES[name] for name, (_, typed) in TYPED_INSTRUCTIONS.items()
+                     if name in RESULT_TYPES})
+
+"""
+Operations evaluated by the Optimizer on constant operands of the proven types.
+"""
+FOLDED_OPERATIONS = {
+    'ADD': op_add_int, 'SUB': op_sub_int, 'MUL': op_mul_int, 'IDIV': op_idiv_int, 'LT': op_lt_typed,
+    'GT': op_gt_typed, 'EQ': op_eq_typed, 'AND': op_and_bool, 'OR': op_or_bool, 'NOT': op_not_bool,
+    'CONCAT': op_concat_string, 'STRLEN': op_strlen_string
+}
+
+"""
+Operations of the binary instructions storing their result to a variable, indexed by the opcode name.
+"""
+BINARY_OPERATIONS = {
+    'ADD': op_add, 'SUB': op_sub, 'MUL': op_mul, 'IDIV': op_idiv, 'LT': op_lt, 'GT': op_gt, 'EQ': op_eq,
+    'AND': op_and, 'OR': op_or
+}
+BINARY_OPERATIONS.update({typed: TYPED_OPERATIONS[BINARY_OPERATIONS[name]][1]
+                          for name, (_, typed) in TYPED_INSTRUCTIONS.items() if name in BINARY_OPERATIONS})
+
+"""
+Instructions that only read their first argument, the other instructions with a variable there write it.
+"""
+READ_ONLY_INSTRUCTIONS = ['WRITE', 'PUSHS', 'EXIT', 'DPRINT']
+
+
+class Input:
+    """
+    Reader of the program input. A file is read at once on the first READ and its lines are served
+    by an index, the standard input is read line by line so it stays interactive.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.lines = None
+        self.index = 0
+
+    def readline(self):
+        """
+        Reads the next line.
+        :return: Line without the trailing whitespace, None at the end of the input.
+        """
+        if self.stream is sys.stdin:
+            line = self.stream.readline()
+            return line.rstrip() if line != '' else None
+        if self.lines is None:
+            self.lines = self.stream.read().split('\n')
+            if self.lines[-1] == '':
+                self.lines.pop()
+        if self.index >= len(self.lines):
+            return None
+        line = self.lines[self.index]
+        self.index += 1
+        return line.rstrip()
+
+
+class AsyncInput(Input):
+    """
+    Reader of the program input from an asyncio.StreamReader, used by the scheduled programs. The scheduled
+    loop awaits wait() before every READ, so a program waiting for its input only suspends its own task.
+    """
+    def __init__(self, reader):
+        self.reader = reader
+        self.line = None
+        self.ready = False
+
+    async def wait(self):
+        """
+        Reads the next line unless it is already read.
+        """
+        if not self.ready:
+            self.line = await self.reader.readline()
+            self.ready = True
+
+    def readline(self):
+        """
+        Returns the line read by wait.
+        :return: Line without the trailing whitespace, None at the end of the input.
+        """
+        self.ready = False
+        return self.line.decode().rstrip() if self.line else None
+
+
+def parse_int(text):
+    """
+    Converts the text to int if it matches the 'int' regex, without using the regex.
+    :param text: Checked text.
+    :return: Int value or None if invalid.
+    """
+    digits = text[1:] if text.startswith('-') else text
+    if digits.isascii() and digits.isdigit():
+        return int(text)
+    return None
+
+
+class ClosureCompiler:
+    """
+    Compiles the instructions into Python closures for the closure engine. Every closure captures its
+    pre-resolved operands and returns the index of the next instruction. Variables are read as their
+    cells and written by the type and the value. The instructions without a specialized closure call
+    the Interpret method of the reference engine.
+    """
+    def __init__(self, interpret):
+        self.interpret = interpret
+        self.buffers = True
+
+    def compile(self, instructions):
+        """
+        :param instructions: List of instruction objects.
+        :return: List of closures indexed as the instructions.
+        """
+        self.buffers = creates_string_buffers(instructions)
+        return [self.compile_instruction(instruction, index) for index, instruction in enumerate(instructions)]
+
+    def compile_instruction(self, instr, index):
+        """
+        :param instr: Instruction object.
+        :param index: Index of the instruction in the list.
+        :return: Closure executing the instruction.
+        """
+        name = OPCODES[instr.opcode]
+        if name in BINARY_OPERATIONS:
+            return self.binary(instr, index, BINARY_OPERATIONS[name])
+        compiler = getattr(self, f'compile_{name.lower()}', None)
+        closure = compiler(instr, index) if compiler is not None else None
+        if closure is None:
+            return self.fallback(instr, index)
+        return closure
+
+    def fallback(self, instr, index):
+        """
+        Runs the instruction by the method of the reference engine.
+        """
+        interpret = self.interpret
+        handler = getattr(interpret, OPCODES[instr.opcode])
+
+        def run():
+            interpret.current = index
+            handler(instr)
+            return interpret.current + 1
+        return run
+
+    def load(self, arg):
+        """
+        :param arg: Symbol argument.
+        :return: Function returning the cell of the symbol, a StringBuffer value is returned as a string.
+        """
+        load_cell = self.load_cell(arg)
+        if arg.type != 'var' or not self.buffers:
+            return load_cell
+
+        def load_materialized():
+            cell = load_cell()
+            if cell.value.__class__ is StringBuffer:
+                return Cell('string', str(cell.value))
+            return cell
+        return load_materialized
+
+    def load_cell(self, arg):
+        """
+        :param arg: Symbol argument.
+        :return: Function returning the cell of the symbol.
+        """
+        if arg.type != 'var':
+            cell = Cell(arg.type, arg.value)
+            return lambda: cell
+        name = arg.name
+        if arg.frame == 'GF':
+            variables = self.interpret.GF.variables
+            slot = arg.slot
+
+            def load_global():
+                if slot is None or (cell := variables[slot]) is UNDEFINED:
+                    err(f"Variable '{name}' does not exist.", ERR_VAR)
+                if cell is None:
+                    err(f"The variable {name} has no value yet.", ERR_VALUE_MISSING)
+                return cell
+            return load_global
+        frame = self.frame(arg)
+
+        def load_frame():
+            variables = frame().variables
+            if name not in variables:
+                err(f"Variable '{name}' does not exist.", ERR_VAR)
+            cell = variables[name]
+            if cell is None:
+                err(f"The variable {name} has no value yet.", ERR_VALUE_MISSING)
+            return cell
+        return load_frame
+
+    def frame(self, arg):
+        """
+        :param arg: Variable argument in the temporary or the local frame.
+        :return: Function returning the frame, it stops the script if the frame does not exist.
+        """
+        interpret = self.interpret
+        if arg.frame == 'LF':
+            lf_stack = interpret.LF_stack
+
+            def local_frame():
+                if not lf_stack:
+                    err("Frame does not exist.", ERR_FRAME)
+                return lf_stack[-1]
+            return local_frame
+
+        def temporary_frame():
+            if interpret.TF is None:
+                err("Frame does not exist.", ERR_FRAME)
+            return interpret.TF
+        return temporary_frame
+
+    def store(self, arg):
+        """
+        :param arg: Variable argument.
+        :return: Function storing a type and a value to the variable.
+        """
+        name = arg.name
+        if arg.frame == 'GF':
+            variables = self.interpret.GF.variables
+            slot = arg.slot
+
+            def store_global(value_type, value):
+                if slot is None or (cell := variables[slot]) is UNDEFINED:
+                    err(f"Variable '{name}' does not exist.", ERR_VAR)
+                if cell is None:
+                    variables[slot] = Cell(value_type, value)
+                else:
+                    cell.type = value_type
+                    cell.value = value
+            return store_global
+        frame = self.frame(arg)
+
+        def store_frame(value_type, value):
+            variables = frame().variables
+            if name not in variables:
+                err(f"Variable '{name}' does not exist.", ERR_VAR)
+            cell = variables[name]
+            if cell is None:
+                variables[name] = Cell(value_type, value)
+            else:
+                cell.type = value_type
+                cell.value = value
+        return store_frame
+
+    def checked(self, arg, run):
+        """
+        Checks the frame of the result variable before the operands are read, as the reference engine does.
+        :param arg: Result variable argument.
+        :param run: Closure of the instruction.
+        :return: Closure with the frame check.
+        """
+        if arg.frame == 'GF':
+            return run
+        frame = self.frame(arg)
+
+        def run_checked():
+            frame()
+            return run()
+        return run_checked
+
+    def binary(self, instr, index, operation):
+        """
+        Arithmetic, relational and boolean instructions storing the result of the operation.
+        """
+        load1, load2 = self.load(instr.args[1]), self.load(instr.args[2])
+        store = self.store(instr.args[0])
+        following = index + 1
+        if OPERATION_TYPES[operation] == 'int':
+            def run():
+                c1, c2 = load1(), load2()
+                store('int', operation(c1.value, c1.type, c2.value, c2.type)[0])
+                return following
+        else:
+            def run():
+                c1, c2 = load1(), load2()
+                store('bool', operation(c1.value, c1.type, c2.value, c2.type)[0])
+                return following
+        return self.checked(instr.args[0], run)
+
+    def compile_label(self, _, index):
+        """
+        LABEL only continues with the next instruction.
+        """
+        following = index + 1
+        return lambda: following
+
+    def compile_move(self, instr, index):
+        """
+        MOVE copying the type and the value of the symbol.
+        """
+        load, store = self.load(instr.args[1]), self.store(instr.args[0])
+        following = index + 1
+
+        def run():
+            cell = load()
+            store(cell.type, cell.value)
+            return following
+        return self.checked(instr.args[0], run)
+
+    def compile_not(self, instr, index):
+        """
+        NOT of a bool symbol.
+        """
+        load, store = self.load(instr.args[1]), self.store(instr.args[0])
+        following = index + 1
+
+        def run():
+            cell = load()
+            if cell.type != 'bool':
+                err("Logical operators only accept bool values.", ERR_TYPES)
+            store('bool', not cell.value)
+            return following
+        return self.checked(instr.args[0], run)
+
+    def compile_concat(self, instr, index):
+        """
+        CONCAT, appending to a string buffer when the result variable is the first operand.
+        """
+        in_place = Optimizer.same_variable(instr.args[0], instr.args[1])
+        load1 = self.load_cell(instr.args[1]) if in_place else self.load(instr.args[1])
+        load2 = self.load(instr.args[2])
+        store = self.store(instr.args[0])
+        concat = append_string if in_place else operator.add
+        following = index + 1
+
+        def run():
+            c1, c2 = load1(), load2()
+            if c1.type != 'string' or c2.type != 'string':
+                err("Value is not of type string.", ERR_TYPES)
+            store('string', concat(c1.value, c2.value))
+            return following
+        return self.checked(instr.args[0], run)
+
+    def compile_strlen(self, instr, index):
+        """
+        STRLEN, reading the length of a string buffer without materializing it.
+        """
+        load, store = self.load_cell(instr.args[1]), self.store(instr.args[0])
+        following = index + 1
+
+        def run():
+            cell = load()
+            if cell.type != 'string':
+                err("Value is not of type string.", ERR_TYPES)
+            store('int', len(cell.value))
+            return following
+        return self.checked(instr.args[0], run)
+
+    def compile_write(self, instr, index):
+        """
+        WRITE of the symbol in its written form.
+        """
+        load = self.load(instr.args[0])
+        write = self.interpret.stdout.write
+        following = index + 1
+
+        def run():
+            cell = load()
+            write(WRITTEN_TEXT.get(cell.type, str)(cell.value))
+            return following
+        return run
+
+    def compile_pushs(self, instr, index):
+        """
+        PUSHS of the symbol to the data stack.
+        """
+        load = self.load(instr.args[0])
+        push_value = self.interpret.stack_values.append
+        push_type = self.interpret.stack_types.append
+        following = index + 1
+
+        def run():
+            cell = load()
+            push_value(cell.value)
+            push_type(cell.type)
+            return following
+        return run
+
+    def compile_pops(self, instr, index):
+        """
+        POPS from the data stack to the variable.
+        """
+        store = self.store(instr.args[0])
+        stack_values, stack_types = self.interpret.stack_values, self.interpret.stack_types
+        following = index + 1
+
+        def run():
+            if not stack_values:
+                err("Data stack is empty.", ERR_VALUE_MISSING)
+            store(stack_types.pop(), stack_values.pop())
+            return following
+        return self.checked(instr.args[0], run)
+
+    def compile_jump(self, instr, _):
+        """
+        JUMP to the instruction after the label, None if the label is missing.
+        """
+        if instr.target is None:
+            return None
+        following = instr.target + 1
+        return lambda: following
+
+    def compile_call(self, instr, index):
+        """
+        CALL saving its position to the call stack, None if the label is missing.
+        """
+        if instr.target is None:
+            return None
+        call_stack = self.interpret.call_stack
+        following = instr.target + 1
+
+        def run():
+            call_stack.append(index)
+            return following
+        return run
+
+    def compile_return(self, _, __):
+        """
+        RETURN to the instruction after the last CALL.
+        """
+        call_stack = self.interpret.call_stack
+
+        def run():
+            if not call_stack:
+                err("Call-stack value missing.", ERR_VALUE_MISSING)
+            return call_stack.pop() + 1
+        return run
+
+    def compile_jumpifeq(self, instr, index, jump_when=True):
+        """
+        JUMPIFEQ, or JUMPIFNEQ if jump_when is False, None if the label is missing.
+        """
+        if instr.target is None:
+            return None
+        load1, load2 = self.load(instr.args[1]), self.load(instr.args[2])
+        taken, following = instr.target + 1, index + 1
+
+        def run():
+            c1, c2 = load1(), load2()
+            if c1.type == c2.type:
+                equal = c1.value == c2.value
+            elif c1.type == 'nil' or c2.type == 'nil':
+                equal = False
+            else:
+                err("Comparing values of two different types.", ERR_TYPES)
+            return taken if equal == jump_when else following
+        return run
+
+    def compile_jumpifneq(self, instr, index):
+        """
+        JUMPIFNEQ, None if the label is missing.
+        """
+        return self.compile_jumpifeq(instr, index, False)
+
+    compile_jumpifeq_typed = compile_jumpifeq
+    compile_jumpifneq_typed = compile_jumpifneq
+
+    def compile_compare_jump_true(self, instr, index, jump_when=True):
+        """
+        Fused comparison and conditional jump storing the result of the comparison as well.
+        """
+        if instr.target is None:
+            return None
+        load1, load2 = self.load(instr.args[1]), self.load(instr.args[2])
+        store = self.store(instr.args[0])
+        operation = instr.operation
+        taken, following = instr.target + 1, index + 1
+
+        def run():
+            c1, c2 = load1(), load2()
+            result = operation(c1.value, c1.type, c2.value, c2.type)[0]
+            store('bool', result)
+            return taken if result == jump_when else following
+        return self.checked(instr.args[0], run)
+
+    def compile_compare_jump_false(self, instr, index):
+        """
+        Fused comparison and conditional jump taken when the comparison is false.
+        """
+        return self.compile_compare_jump_true(instr, index, False)
+
+    def compile_stack_operation(self, instr, index):
+        """
+        Fused PUSHS, PUSHS, a binary stack instruction and POPS storing the result to the variable.
+        """
+        load1, load2 = self.load(instr.args[0]), self.load(instr.args[1])
+        store = self.store(instr.args[2])
+        operation = instr.operation
+        following = index + 1
+
+        def run():
+            c1, c2 = load1(), load2()
+            value, value_type = operation(c1.value, c1.type, c2.value, c2.type)
+            store(value_type, value)
+            return following
+        return run
+
+
+class BlockCompiler:
+    """
+    Compiles the basic blocks into Python functions for the codegen engine. Every block is translated to
+    the source of one function, which runs the whole block and returns the number of the next block.
+    The cells of the global variables are kept in local variables of the function once they are loaded,
+    the temporary and local frames are accessed by the closures of the ClosureCompiler. Instructions
+    without a translation call their Interpret method, blocks with READ or BREAK are run by the reference
+    engine instruction by instruction.
+    """
+    FALLBACK = ['READ', 'BREAK']
+
+    def __init__(self, interpret):
+        self.interpret = interpret
+        self.closures = ClosureCompiler(interpret)
+        self.namespace = dict(globals())
+        self.instructions = None
+        self.block_at = None
+        self.lines = []
+        self.known = {}
+        self.names = 0
+
+    def compile(self, instructions):
+        """
+        :param instructions: List of instruction objects with resolved jump targets.
+        :return: List of the block functions indexed by the block number.
+        """
+        self.instructions = instructions
+        self.closures.buffers = creates_string_buffers(instructions)
+        blocks = Optimizer(instructions, 0).basic_blocks()
+        self.block_at = {block.start: number for number, block in enumerate(blocks)}
+        # * RETURN and the reference engine continue after the CALL or the LABEL jumped to
+        resume = dict(self.block_at)
+        for number, block in enumerate(blocks):
+            if instructions[block.start].opcode == OPCODE_NUMBERS['LABEL']:
+                resume.setdefault(block.start + 1, number)
+        resume[len(instructions)] = len(blocks)
+        interpret = self.interpret
+        self.namespace.update(G=interpret.GF.variables, calls=interpret.call_stack, values=interpret.stack_values,
+                              types=interpret.stack_types, out=interpret.stdout.write, resume=resume)
+        functions = []
+        source = []
+        for number, block in enumerate(blocks):
+            block_instructions = instructions[block.start:block.end]
+            if any(OPCODES[instruction.opcode] in self.FALLBACK for instruction in block_instructions):
+                functions.append(self.fallback(block, resume))
+            else:
+                source.append(self.translate(number, block))
+                functions.append(None)
+        exec(compile('\n'.join(source), '<IPPcode21 blocks>', 'exec'), self.namespace)
+        return [function or self.namespace[f'block_{number}'] for number, function in enumerate(functions)]
+
+    def fallback(self, block, resume):
+        """
+        Runs the block by the methods of the reference engine.
+        :param block: Basic block.
+        :param resume: Numbers of the blocks by the index of the instruction to continue with.
+        :return: Block function.
+        """
+        interpret = self.interpret
+        steps = [(index, getattr(interpret, OPCODES[instruction.opcode]), instruction)
+                 for index, instruction in enumerate(self.instructions[block.start:block.end], block.start)]
+
+        def run():
+            for index, handler, instruction in steps:
+                interpret.current = index
+                handler(instruction)
+            return resume[interpret.current + 1]
+        return run
+
+    def translate(self, number, block):
+        """
+        :param number: Number of the block.
+        :param block: Basic block.
+        :return: Source of the block function.
+        """
+        self.lines = [f'def block_{number}(G=G, calls=calls, values=values, types=types, out=out, resume=resume):']
+        self.known = {}
+        for index in range(block.start, block.end):
+            instruction = self.instructions[index]
+            name = OPCODES[instruction.opcode]
+            translator = getattr(self, f'translate_{name.lower()}', None)
+            if instruction.opcode in JUMP_OPCODES | CONDITIONAL_JUMPS and instruction.target is None:
+                translator = None
+            if name in BINARY_OPERATIONS:
+                self.translate_binary(instruction, name)
+            elif translator is not None:
+                translator(instruction, index)
+            else:
+                self.delegate(instruction)
+        self.emit(f'return {number + 1}')
+        return '\n'.join(self.lines)
+
+    def emit(self, line):
+        """
+        Adds a line to the body of the block function.
+        """
+        self.lines.append('    ' + line)
+
+    def name(self, prefix='v'):
+        """
+        :return: New unique name for a local variable or a namespace object.
+        """
+        self.names += 1
+        return f'{prefix}{self.names}'
+
+    def constant(self, value):
+        """
+        Stores an object to the namespace of the generated code.
+        :param value: Stored object.
+        :return: Name of the object.
+        """
+        name = self.name('k')
+        self.namespace[name] = value
+        return name
+
+    def delegate(self, instruction):
+        """
+        Calls the Interpret method of the instruction, which may change any global variable.
+        """
+        handler = getattr(self.interpret, OPCODES[instruction.opcode])
+        self.emit(f'{self.constant(handler)}({self.constant(instruction)})')
+        self.known.clear()
+
+    def operand(self, arg, materialize=True):
+        """
+        Emits the load of a symbol.
+        :param arg: Symbol argument.
+        :param materialize: When true, a StringBuffer value is loaded as a string.
+        :return: Expressions of the cell (None for constants), the type and the value.
+        """
+        if arg.type != 'var':
+            return None, repr(arg.type), repr(arg.value)
+        cell = self.load_operand(arg)
+        if materialize and self.closures.buffers:
+            loaded = self.name()
+            self.emit(f'{loaded} = {cell} if {cell}.value.__class__ is not StringBuffer '
+                      f"else Cell('string', str({cell}.value))")
+            cell = loaded
+        return cell, f'{cell}.type', f'{cell}.value'
+
+    def load_operand(self, arg):
+        """
+        Emits the load of a variable cell.
+        :param arg: Variable argument.
+        :return: Name of the local variable holding the cell.
+        """
+        if arg.frame != 'GF':
+            cell = self.name()
+            self.emit(f'{cell} = {self.constant(self.closures.load_cell(arg))}()')
+        elif arg.slot in self.known:
+            cell = self.known[arg.slot]
+        else:
+            cell = self.name()
+            undefined = f"err({repr(f'Variable {chr(39)}{arg.name}{chr(39)} does not exist.')}, ERR_VAR)"
+            if arg.slot is None:
+                self.emit(undefined)
+                self.emit(f'{cell} = None')
+                return cell
+            self.emit(f'{cell} = G[{arg.slot}]')
+            self.emit(f'if {cell} is None or {cell} is UNDEFINED:')
+            self.emit(f"    {undefined} if {cell} is UNDEFINED else "
+                      f"err({repr(f'The variable {arg.name} has no value yet.')}, ERR_VALUE_MISSING)")
+            self.known[arg.slot] = cell
+        return cell
+
+    def check_frame(self, arg):
+        """
+        Emits the check of the result variable frame done by the reference engine before reading the operands.
+        """
+        if arg.frame != 'GF':
+            self.emit(f'{self.constant(self.closures.frame(arg))}()')
+
+    def store(self, arg, value_type, value):
+        """
+        Emits the store of a value to a variable.
+        :param arg: Variable argument.
+        :param value_type: Expression of the type.
+        :param value: Expression of the value, evaluated before the variable is changed.
+        """
+        if not value.isidentifier():
+            result = self.name()
+            self.emit(f'{result} = {value}')
+            value = result
+        if arg.frame != 'GF':
+            self.emit(f'{self.constant(self.closures.store(arg))}({value_type}, {value})')
+            return
+        if arg.slot is None:
+            self.emit(f"err({repr(f'Variable {chr(39)}{arg.name}{chr(39)} does not exist.')}, ERR_VAR)")
+            return
+        if arg.slot in self.known:
+            cell = self.known[arg.slot]
+            self.emit(f'{cell}.type = {value_type}; {cell}.value = {value}')
+            return
+        cell = self.name()
+        self.emit(f'{cell} = G[{arg.slot}]')
+        self.emit(f'if {cell} is None or {cell} is UNDEFINED:')
+        self.emit(f'    if {cell} is UNDEFINED:')
+        self.emit(f"        err({repr(f'Variable {chr(39)}{arg.name}{chr(39)} does not exist.')}, ERR_VAR)")
+        self.emit(f'    {cell} = G[{arg.slot}] = Cell({value_type}, {value})')
+        self.emit('else:')
+        self.emit(f'    {cell}.type = {value_type}; {cell}.value = {value}')
+        self.known[arg.slot] = cell
+
+    def require(self, operands, value_type, message):
+        """
+        Emits the type check of the operands, skipped for the constants.
+        :param operands: Operand expressions returned by operand.
+        :param value_type: Required type.
+        :param message: Error message.
+        """
+        conditions = []
+        for cell, type_expression, _ in operands:
+            if type_expression.startswith("'"):
+                if type_expression != repr(value_type):
+                    conditions = ['True']
+                    break
+            else:
+                conditions.append(f'{type_expression} != {repr(value_type)}')
+        if conditions:
+            self.emit(f"if {' or '.join(conditions)}: err({repr(message)}, ERR_TYPES)")
+
+    def translate_binary(self, instruction, name):
+        """
+        Arithmetic, relational and boolean instructions, inlined as Python operators where the types allow it.
+        """
+        args = instruction.args
+        self.check_frame(args[0])
+        o1, o2 = self.operand(args[1]), self.operand(args[2])
+        v1, v2 = o1[2], o2[2]
+        if name in ['ADD', 'SUB', 'MUL', 'IDIV', 'ADD_INT', 'SUB_INT', 'MUL_INT', 'IDIV_INT']:
+            if not name.endswith('_INT'):
+                self.require([o1, o2], 'int', "Non-numeric value in arithmetic instruction.")
+            if name.startswith('IDIV'):
+                self.emit(f'if {v2} == 0: err("Division by zero.", ERR_VALUE_WRONG)')
+            operator = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'IDIV': '//'}[name.split('_')[0]]
+            self.store(args[0], "'int'", f'{v1} {operator} {v2}')
+            return
+        if name in TYPED_INSTRUCTIONS:
+            operation = self.constant(BINARY_OPERATIONS[name])
+            result = f'{operation}({v1}, {o1[1]}, {v2}, {o2[1]})[0]'
+        else:
+            operator = {'LT_TYPED': '<', 'GT_TYPED': '>', 'EQ_TYPED': '=='}.get(name)
+            if operator is not None:
+                result = f'{v1} {operator} {v2}'
+            else:
+                result = f"{v1} {name.split('_')[0].lower()} {v2}"
+        self.store(args[0], "'bool'", result)
+
+    def translate_label(self, _, __):
+        """
+        LABEL emits nothing, the block starts at it.
+        """
+        pass
+
+    def translate_move(self, instruction, _):
+        """
+        MOVE copying the type and the value of the symbol.
+        """
+        self.check_frame(instruction.args[0])
+        _, value_type, value = self.operand(instruction.args[1])
+        self.store(instruction.args[0], value_type, value)
+
+    def translate_defvar(self, instruction, _):
+        """
+        DEFVAR of a global variable, the other frames are left to the Interpret method.
+        """
+        arg = instruction.args[0]
+        if arg.frame != 'GF':
+            self.delegate(instruction)
+            return
+        self.emit(f'if G[{arg.slot}] is not UNDEFINED:')
+        self.emit(f"    err({repr(f'Variable {chr(39)}{arg.name}{chr(39)} is already defined.')}, ERR_SEM)")
+        self.emit(f'G[{arg.slot}] = None')
+        self.known.pop(arg.slot, None)
+
+    def translate_not(self, instruction, _, typed=False):
+        """
+        NOT, without the type check if the operand is known to be bool.
+        """
+        self.check_frame(instruction.args[0])
+        operand = self.operand(instruction.args[1])
+        if not typed:
+            self.require([operand], 'bool', "Logical operators only accept bool values.")
+        self.store(instruction.args[0], "'bool'", f'not {operand[2]}')
+
+    def translate_not_bool(self, instruction, index):
+        """
+        NOT of an operand known to be bool.
+        """
+        self.translate_not(instruction, index, True)
+
+    def translate_concat(self, instruction, _, typed=False):
+        """
+        CONCAT, appending to a string buffer when the result variable is the first operand.
+        """
+        self.check_frame(instruction.args[0])
+        in_place = Optimizer.same_variable(instruction.args[0], instruction.args[1])
+        o1, o2 = self.operand(instruction.args[1], not in_place), self.operand(instruction.args[2])
+        if not typed:
+            self.require([o1, o2], 'string', "Value is not of type string.")
+        if in_place:
+            self.store(instruction.args[0], "'string'", f'append_string({o1[2]}, {o2[2]})')
+        else:
+            self.store(instruction.args[0], "'string'", f'{o1[2]} + {o2[2]}')
+
+    def translate_concat_string(self, instruction, index):
+        """
+        CONCAT of operands known to be strings.
+        """
+        self.translate_concat(instruction, index, True)
+
+    def translate_strlen(self, instruction, _, typed=False):
+        """
+        STRLEN, reading the length of a string buffer without materializing it.
+        """
+        self.check_frame(instruction.args[0])
+        operand = self.operand(instruction.args[1], False)
+        if not typed:
+            self.require([operand], 'string', "Value is not of type string.")
+        self.store(instruction.args[0], "'int'", f'len({operand[2]})')
+
+    def translate_strlen_string(self, instruction, index):
+        """
+        STRLEN of an operand known to be a string.
+        """
+        self.translate_strlen(instruction, index, True)
+
+    def translate_write(self, instruction, _):
+        """
+        WRITE, a constant is converted to its written form already by the translation.
+        """
+        arg = instruction.args[0]
+        if arg.type != 'var':
+            self.emit(f"out({repr(WRITTEN_TEXT.get(arg.type, str)(arg.value))})")
+            return
+        _, value_type, value = self.operand(arg)
+        self.emit(f"out(WRITTEN_TEXT.get({value_type}, str)({value}))")
+
+    def translate_pushs(self, instruction, _):
+        """
+        PUSHS of the symbol to the data stack.
+        """
+        _, value_type, value = self.operand(instruction.args[0])
+        self.emit(f'values.append({value}); types.append({value_type})')
+
+    def translate_pops(self, instruction, _):
+        """
+        POPS from the data stack to the variable.
+        """
+        self.check_frame(instruction.args[0])
+        self.emit('if not values: err("Data stack is empty.", ERR_VALUE_MISSING)')
+        value_type, value = self.name(), self.name()
+        self.emit(f'{value_type} = types.pop(); {value} = values.pop()')
+        self.store(instruction.args[0], value_type, value)
+
+    def translate_jump(self, instruction, _):
+        """
+        JUMP returning the number of the block of the label.
+        """
+        self.emit(f'return {self.block_at[instruction.target]}')
+
+    def translate_call(self, instruction, index):
+        """
+        CALL saving its position to the call stack and returning the block of the label.
+        """
+        self.emit(f'calls.append({index})')
+        self.emit(f'return {self.block_at[instruction.target]}')
+
+    def translate_return(self, _, __):
+        """
+        RETURN to the block after the last CALL.
+        """
+        self.emit('if not calls: err("Call-stack value missing.", ERR_VALUE_MISSING)')
+        self.emit('return resume[calls.pop() + 1]')
+
+    def translate_jumpifeq(self, instruction, _, jump_when=True, typed=False):
+        """
+        JUMPIFEQ, or JUMPIFNEQ if jump_when is False, compared directly if typed.
+        """
+        o1, o2 = self.operand(instruction.args[1]), self.operand(instruction.args[2])
+        condition = '' if jump_when else 'not '
+        if typed:
+            self.emit(f'if {condition}{o1[2]} == {o2[2]}: return {self.block_at[instruction.target]}')
+            return
+        equal = self.name()
+        self.emit(f'{equal} = {self.constant(op_eq)}({o1[2]}, {o1[1]}, {o2[2]}, {o2[1]})[0]')
+        self.emit(f'if {condition}{equal}: return {self.block_at[instruction.target]}')
+
+    def translate_jumpifneq(self, instruction, index):
+        """
+        JUMPIFNEQ.
+        """
+        self.translate_jumpifeq(instruction, index, False)
+
+    def translate_jumpifeq_typed(self, instruction, index):
+        """
+        JUMPIFEQ of operands known to be of the same type.
+        """
+        self.translate_jumpifeq(instruction, index, True, True)
+
+    def translate_jumpifneq_typed(self, instruction, index):
+        """
+        JUMPIFNEQ of operands known to be of the same type.
+        """
+        self.translate_jumpifeq(instruction, index, False, True)
+
+    def translate_jumpifeqs(self, instruction, _, jump_when=True):
+        """
+        JUMPIFEQS, or JUMPIFNEQS if jump_when is False.
+        """
+        self.emit('if len(values) < 2: err("The data stack is empty.", ERR_VALUE_MISSING)')
+        v1, t1, v2, t2 = self.name(), self.name(), self.name(), self.name()
+        self.emit(f'{v2} = values.pop(); {v1} = values.pop(); {t2} = types.pop(); {t1} = types.pop()')
+        condition = '' if jump_when else 'not '
+        self.emit(f'if {condition}{self.constant(op_eq)}({v1}, {t1}, {v2}, {t2})[0]: '
+                  f'return {self.block_at[instruction.target]}')
+
+    def translate_jumpifneqs(self, instruction, index):
+        """
+        JUMPIFNEQS.
+        """
+        self.translate_jumpifeqs(instruction, index, False)
+
+    def translate_compare_jump_true(self, instruction, _, jump_when=True):
+        """
+        Fused comparison and conditional jump storing the result of the comparison as well.
+        """
+        args = instruction.args
+        self.check_frame(args[0])
+        o1, o2 = self.operand(args[1]), self.operand(args[2])
+        result = self.name()
+        self.emit(f'{result} = {self.constant(instruction.operation)}({o1[2]}, {o1[1]}, {o2[2]}, {o2[1]})[0]')
+        self.store(args[0], "'bool'", result)
+        condition = '' if jump_when else 'not '
+        self.emit(f'if {condition}{result}: return {self.block_at[instruction.target]}')
+
+    def translate_compare_jump_false(self, instruction, index):
+        """
+        Fused comparison and conditional jump taken when the comparison is false.
+        """
+        self.translate_compare_jump_true(instruction, index, False)
+
+    def translate_stack_operation(self, instruction, _):
+        """
+        Fused PUSHS, PUSHS, a binary stack instruction and POPS storing the result to the variable.
+        """
+        args = instruction.args
+        o1, o2 = self.operand(args[0]), self.operand(args[1])
+        result = self.name()
+        self.emit(f'{result} = {self.constant(instruction.operation)}({o1[2]}, {o1[1]}, {o2[2]}, {o2[1]})[0]')
+        self.store(args[2], repr(OPERATION_TYPES[instruction.operation]), result)
+
+
+class LimitExceeded(Exception):
+    """
+    Raised by Limits when a run exceeds its instruction or time limit.
+    """
+    def __init__(self, message, limit):
+        super().__init__(message)
+        self.message = message
+        self.limit = limit
+
+
+class Limits:
+    """
+    Instruction and wall time limits of a run, checked by the limited loops of Interpret. The time
+    is only read every INTERVAL instructions.
+    """
+    INTERVAL = 1024
+
+    def __init__(self, max_instructions=None, timeout=None):
+        """
+        :param max_instructions: Number of instructions the run may execute, unlimited if None.
+        :param timeout: Wall time of the run in seconds counted from now, unlimited if None.
+        """
+        self.max_instructions = max_instructions
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+
+    def check(self, steps):
+        """
+        Called before executing an instruction.
+        :param steps: Number of the instructions executed so far.
+        :return: Number of the executed instructions at which to check again.
+        :raises LimitExceeded: When a limit is exceeded.
+        """
+        if self.max_instructions is not None and steps >= self.max_instructions:
+            raise LimitExceeded("Instruction limit exceeded.", 'instructions')
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise LimitExceeded("Time limit exceeded.", 'time')
+        following = steps + self.INTERVAL
+        return following if self.max_instructions is None else min(following, self.max_instructions)
+
+
+class Profile:
+    """
+    Execution counts and wall times of the instructions, collected by the profiled loops of Interpret.
+    The counters are indexed as the instruction list and grouped by opcode and order in the report.
+    CALL and RETURN also maintain a shadow stack of the called labels, the instructions and the time
+    between two of them are attributed to the stack.
+    """
+    ROOT = '<main>'
+
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.counts = [0] * len(instructions)
+        self.times = [0] * len(instructions)
+        self.stack = (self.ROOT,)
+        self.stacks = {}
+        self.calls = {}
+        self.mark_steps = 0
+        self.mark_time = time.perf_counter_ns()
+
+    def transfer(self, instr, steps, now):
+        """
+        Attributes the instructions executed since the last CALL or RETURN to the shadow stack and updates it.
+        :param instr: Executed CALL or RETURN instruction.
+        :param steps: Number of instructions executed so far.
+        :param now: Current time in ns.
+        """
+        self.attribute(steps, now)
+        if instr.opcode == OPCODE_NUMBERS['CALL']:
+            label = instr.args[0].text
+            self.stack += (label,)
+            self.calls[label] = self.calls.get(label, 0) + 1
+        else:
+            self.stack = self.stack[:-1] or (self.ROOT,)
+
+    def attribute(self, steps, now):
+        """
+        :param steps: Number of instructions executed so far.
+        :param now: Current time in ns.
+        """
+        totals = self.stacks.setdefault(self.stack, [0, 0])
+        totals[0] += steps - self.mark_steps
+        totals[1] += now - self.mark_time
+        self.mark_steps, self.mark_time = steps, now
+
+    def finish(self):
+        """
+        Attributes the instructions executed after the last CALL or RETURN.
+        """
+        self.attribute(sum(self.counts), time.perf_counter_ns())
+
+    def by_label(self):
+        """
+        :return: List of (label, calls, inclusive count, exclusive count, inclusive ns, exclusive ns),
+            slowest first. Recursive calls are counted once in the inclusive values.
+        """
+        totals = {}
+        for stack, (count, elapsed) in self.stacks.items():
+            for label in set(stack):
+                total = totals.setdefault(label, [0, 0, 0, 0])
+                total[0] += count
+                total[2] += elapsed
+            total = totals[stack[-1]]
+            total[1] += count
+            total[3] += elapsed
+        rows = [(label, self.calls.get(label, 0), *total) for label, total in totals.items()]
+        return sorted(rows, key=lambda row: (-row[4], row[0]))
+
+    def write_calls(self, path, report_format):
+        """
+        Writes the report of the subroutines.
+        :param path: Path to the report file.
+        :param report_format: 'table' or 'json'.
+        """
+        rows = self.by_label()
+        with open(path, 'w') as file:
+            if report_format == 'json':
+                file.write(json.dumps([{'label': label, 'calls': calls, 'inclusive_count': inclusive_count,
+                                        'exclusive_count': exclusive_count, 'inclusive_time_ns': inclusive_time,
+                                        'exclusive_time_ns': exclusive_time}
+                                       for label, calls, inclusive_count, exclusive_count, inclusive_time,
+                                       exclusive_time in rows], indent=2) + '\n')
+                return
+            file.write(f'{"label":<20}{"calls":>10}{"incl count":>14}{"excl count":>14}'
+                       f'{"incl ms":>12}{"excl ms":>12}\n')
+            for label, calls, inclusive_count, exclusive_count, inclusive_time, exclusive_time in rows:
+                file.write(f'{label:<20}{calls:>10}{inclusive_count:>14}{exclusive_count:>14}'
+                           f'{inclusive_time / 1e6:>12.3f}{exclusive_time / 1e6:>12.3f}\n')
+
+    def write_stacks(self, path):
+        """
+        Writes the exclusive time in ns of every call stack in the collapsed format, one stack per line.
+        :param path: Path to the output file.
+        """
+        with open(path, 'w') as file:
+            for stack, (_, elapsed) in sorted(self.stacks.items()):
+                file.write(f'{";".join(stack)} {elapsed}\n')
+
+    def by_order(self):
+        """
+        :return: List of (order, opcode name, count, time in ns) of the executed instructions, slowest first.
+        """
+        rows = [(instruction.order, OPCODES[instruction.opcode], count, elapsed)
+                for instruction, count, elapsed in zip(self.instructions, self.counts, self.times) if count]
+        return sorted(rows, key=lambda row: (-row[3], row[0]))
+
+    def by_opcode(self):
+        """
+        :return: List of (opcode name, count, time in ns) of the executed opcodes, slowest first.
+        """
+        totals = {}
+        for _, name, count, elapsed in self.by_order():
+            total = totals.setdefault(name, [0, 0])
+            total[0] += count
+            total[1] += elapsed
+        return sorted(((name, count, elapsed) for name, (count, elapsed) in totals.items()),
+                      key=lambda row: (-row[2], row[0]))
+
+    def write(self, path, report_format):
+        """
+        Writes the report.
+        :param path: Path to the report file.
+        :param report_format: 'table' or 'json'.
+        """
+        with open(path, 'w') as file:
+            file.write(self.json() if report_format == 'json' else self.table())
+
+    def json(self):
+        """
+        :return: The report as a JSON document.
+        """
+        return json.dumps({
+            'count': sum(self.counts),
+            'time_ns': sum(self.times),
+            'opcodes': [{'opcode': name, 'count': count, 'time_ns': elapsed}
+                        for name, count, elapsed in self.by_opcode()],
+            'instructions': [{'order': order, 'opcode': name, 'count': count, 'time_ns': elapsed}
+                             for order, name, count, elapsed in self.by_order()],
+        }, indent=2) + '\n'
+
+    def table(self):
+        """
+        :return: The report as text tables.
+        """
+        total_count, total_time = sum(self.counts), sum(self.times)
+        lines = [f'{total_count} instructions executed in {total_time / 1e6:.3f} ms', '',
+                 f'{"opcode":<20}{"count":>12}{"time ms":>12}{"ns/instr":>10}{"time %":>8}']
+        for name, count, elapsed in self.by_opcode():
+            lines.append(f'{name:<20}{count:>12}{elapsed / 1e6:>12.3f}{elapsed // count:>10}'
+                         f'{100 * elapsed / (total_time or 1):>8.1f}')
+        lines += ['', f'{"order":>8}  {"opcode":<20}{"count":>12}{"time ms":>12}{"ns/instr":>10}']
+        for order, name, count, elapsed in self.by_order():
+            lines.append(f'{order:>8}  {name:<20}{count:>12}{elapsed / 1e6:>12.3f}{elapsed // count:>10}')
+        return '\n'.join(lines) + '\n'
+
+
+class Interpret:
+    """
+    The main class containing the instructions with their actions.
+    """
+    GF = None
+    TF = None
+    LF_stack = None
+    LF = None
+    call_stack = None
+    stack_values = None
+    stack_types = None
+    current = 0
+    prep = None
+    stdout = None
+    stderr = None
+    input = None
+
+    def __init__(self, prep=None, stdout=None, stderr=None):
+        """
+        Prepares the program for the run, all state of the run is kept by the instance.
+        :param prep: Preparation object with the loaded program, built from the console arguments if None.
+        :param stdout: Text stream written by WRITE, sys.stdout if None.
+        :param stderr: Text stream written by DPRINT, BREAK and the optimizer report, sys.stderr if None.
+        """
+        self.prep = prep if prep is not None else Preparation()
+        self.LF_stack = []
+        self.call_stack = []
+        self.stack_values = []
+        self.stack_types = []
+        stdout = stdout if stdout is not None else sys.stdout
+        stderr = stderr if stderr is not None else sys.stderr
+        if self.prep.opt_level > 0:
+            optimizer = Optimizer(self.prep.instructions, self.prep.opt_level)
+            self.prep.instructions = optimizer.run()
+            if self.prep.opt_report:
+                stderr.write(optimizer.report())
+        self.GF = GlobalFrame(self.prep.gf_slots)
+        self.stdout = Output(stdout, self.prep.output_buffer)
+        self.stderr = Output(stderr, self.prep.output_buffer)
+        self.input = Input(self.prep.int_input)
+
+    def run(self, limits=None):
+        """
+        Runs the program.
+        :param limits: Limits object of the run, not supported by the codegen engine, unlimited if None.
+        :return: Exit code, 0 or the value of EXIT.
+        :raises InterpretError: When the program stops with an error.
+        :raises LimitExceeded: When the program exceeds the limits.
+        :raises ValueError: When the codegen engine is asked for limits or profiling, which it does not support.
+        """
+        profiled = self.prep.profile or self.prep.profile_calls or self.prep.profile_stacks
+        if self.prep.engine == 'codegen' and (limits is not None or profiled):
+            raise ValueError('Limits and profiling are not supported by the codegen engine.')
+        profile = Profile(self.prep.instructions) if profiled else None
+        try:
+            if limits is not None and self.prep.engine == 'closure':
+                self.run_closures_limited(self.prep.instructions, limits)
+            elif limits is not None:
+                self.run_handlers_limited(self.prep.instructions, limits)
+            elif profile is not None and self.prep.engine == 'closure':
+                self.run_closures_profiled(self.prep.instructions, profile)
+            elif profile is not None:
+                self.run_handlers_profiled(self.prep.instructions, profile)
+            elif self.prep.engine == 'closure':
+                self.run_closures(self.prep.instructions)
+            elif self.prep.engine == 'codegen':
+                self.run_blocks(self.prep.instructions)
+            else:
+                self.run_handlers(self.prep.instructions)
+        except ProgramExit as exit_request:
+            return exit_request.code
+        finally:
+            self.finish()
+            if profile is not None:
+                self.write_profile(profile)
+        return 0
+
+    async def run_async(self, quantum=QUANTUM, limits=None):
+        """
+        Runs the program as an asyncio task, which lets the other tasks run after every quantum of instructions
+        and while READ waits for the input. The input has to be an AsyncInput. The codegen engine runs whole
+        blocks and is not supported.
+        :param quantum: Number of instructions executed at a time.
+        :param limits: Limits object of the run, checked as by the limited loops.
+        :return: Exit code, 0 or the value of EXIT.
+        :raises InterpretError: When the program stops with an error.
+        :raises LimitExceeded: When the program exceeds the limits.
+        :raises ValueError: When the engine is codegen.
+        """
+        import asyncio
+        if self.prep.engine == 'codegen':
+            raise ValueError('The codegen engine can not be scheduled.')
+        instruction_list = self.prep.instructions
+        if self.prep.engine == 'closure':
+            closures = ClosureCompiler(self).compile(instruction_list)
+        else:
+            handlers = self.dispatch_table()
+            closures = None
+        waits = [instr.opcode == OPCODE_NUMBERS['READ'] for instr in instruction_list]
+        instr_count = len(instruction_list)
+        steps = 0
+        check_at = 0 if limits is not None else None
+        yield_at = quantum
+        try:
+            self.current = 0
+            while self.current < instr_count:
+                if steps == check_at:
+                    check_at = limits.check(steps)
+                if waits[self.current]:
+                    await self.input.wait()
+                if closures is not None:
+                    self.current = closures[self.current]()
+                else:
+                    instr = instruction_list[self.current]
+                    handlers[instr.opcode](instr)
+                    self.current += 1
+                steps += 1
+                if steps == yield_at:
+                    yield_at += quantum
+                    await asyncio.sleep(0)
+        except ProgramExit as exit_request:
+            return exit_request.code
+        finally:
+            self.finish()
+        return 0
+
+    def finish(self):
+        """
+        Flushes the outputs and closes the input opened for the program.
+        """
+        self.stdout.flush()
+        self.stderr.flush()
+        if self.prep.input_opened:
+            self.prep.int_input.close()
+
+    def run_handlers(self, instruction_list):
+        """
+        The reference engine - dispatches every instruction to its method.
+        :param instruction_list: List of instruction objects.
+        """
+        handlers = self.dispatch_table()
+        instr_count = len(instruction_list)
+        self.current = 0
+        while self.current < instr_count:
+            instr = instruction_list[self.current]
+            handlers[instr.opcode](instr)
+            self.current += 1
+
+    def write_profile(self, profile):
+        """
+        Writes the requested profile reports.
+        :param profile: Profile object with the collected counters.
+        """
+        profile.finish()
+        if self.prep.profile:
+            profile.write(self.prep.profile, self.prep.profile_format)
+        if self.prep.profile_calls:
+            profile.write_calls(self.prep.profile_calls, self.prep.profile_format)
+        if self.prep.profile_stacks:
+            profile.write_stacks(self.prep.profile_stacks)
+
+    def run_handlers_profiled(self, instruction_list, profile):
+        """
+        The reference engine, counting and timing every dispatched instruction.
+        :param instruction_list: List of instruction objects.
+        :param profile: Profile object collecting the counters.
+        """
+        handlers = self.dispatch_table()
+        counts, times = profile.counts, profile.times
+        clock = time.perf_counter_ns
+        instr_count = len(instruction_list)
+        steps = 0
+        profile.mark_time = clock()
+        self.current = 0
+        while self.current < instr_count:
+            index = self.current
+            instr = instruction_list[index]
+            counts[index] += 1
+            steps += 1
+            start = clock()
+            handlers[instr.opcode](instr)
+            end = clock()
+            times[index] += end - start
+            if instr.opcode in CALL_OPCODES:
+                profile.transfer(instr, steps, end)
+            self.current += 1
+
+    def run_handlers_limited(self, instruction_list, limits):
+        """
+        The reference engine, stopping the program when it exceeds the limits.
+        :param instruction_list: List of instruction objects.
+        :param limits: Limits object of the run.
+        """
+        handlers = self.dispatch_table()
+        instr_count = len(instruction_list)
+        steps = 0
+        check_at = 0
+        self.current = 0
+        while self.current < instr_count:
+            if steps == check_at:
+                check_at = limits.check(steps)
+            instr = instruction_list[self.current]
+            handlers[instr.opcode](instr)
+            self.current += 1
+            steps += 1
+
+    def run_closures(self, instruction_list):
+        """
+        The closure engine - runs the instructions compiled by the ClosureCompiler.
+        :param instruction_list: List of instruction objects.
+        """
+        closures = ClosureCompiler(self).compile(instruction_list)
+        instr_count = len(closures)
+        current = 0
+        while current < instr_count:
+            current = closures[current]()
+
+    def run_closures_profiled(self, instruction_list, profile):
+        """
+        The closure engine, counting and timing every called closure.
+        :param instruction_list: List of instruction objects.
+        :param profile: Profile object collecting the counters.
+        """
+        closures = ClosureCompiler(self).compile(instruction_list)
+        counts, times = profile.counts, profile.times
+        clock = time.perf_counter_ns
+        instr_count = len(closures)
+        steps = 0
+        profile.mark_time = clock()
+        current = 0
+        while current < instr_count:
+            counts[current] += 1
+            steps += 1
+            start = clock()
+            following = closures[current]()
+            end = clock()
+            times[current] += end - start
+            instr = instruction_list[current]
+            if instr.opcode in CALL_OPCODES:
+                profile.transfer(instr, steps, end)
+            current = following
+
+    def run_closures_limited(self, instruction_list, limits):
+        """
+        The closure engine, stopping the program when it exceeds the limits.
+        :param instruction_list: List of instruction objects.
+        :param limits: Limits object of the run.
+        """
+        closures = ClosureCompiler(self).compile(instruction_list)
+        instr_count = len(closures)
+        steps = 0
+        check_at = 0
+        current = 0
+        while current < instr_count:
+            if steps == check_at:
+                check_at = limits.check(steps)
+            current = closures[current]()
+            steps += 1
+
+    def run_blocks(self, instruction_list):
+        """
+        The codegen engine - runs the basic blocks compiled by the BlockCompiler.
+        :param instruction_list: List of instruction objects.
+        """
+        blocks = BlockCompiler(self).compile(instruction_list)
+        block_count = len(blocks)
+        current = 0
+        while current < block_count:
+            current = blocks[current]()
+
+    def dispatch_table(self):
+        """
+        Resolves every opcode to its bound handler method.
+        :return: List of handlers indexed by the opcode number.
+        """
+        return [getattr(self, name) for name in OPCODES]
+
+    def return_frame(self, instr, var_index):
+        """
+        Returns the frame object.
+        :param instr: Current instruction object.
+        :param var_index: Index of the considered instruction argument.
+        :return: Frame object, variable argument.
+        """
+        var = instr.args[var_index]
+        if var.frame == 'GF':
+            return self.GF, var
+        if var.frame == 'LF':
+            if not self.LF_stack:
+                err("Frame does not exist.", ERR_FRAME)
+            return self.LF_stack[-1], var
+        if self.TF is None:
+            err("Frame does not exist.", ERR_FRAME)
+        return self.TF, var
+
+    def resolve_symb(self, instr, symb_index, geterr=True, materialize=True):
+        """
+        Get the value of symbol, which is either a constant or a variable.
+        :param instr: Current instruction object.
+        :param symb_index: Index of the considered instruction argument.
+        :param geterr: If True, throws an exception in case of an empty variable.
+        :param materialize: If False, a StringBuffer value is returned as is.
+        :return: Symbol value and type.
         """
-        if value:
-            return 'true'
-        if not value:
-            return 'false'
+        arg = instr.args[symb_index]
+        if arg.type == 'var':
+            current_frame, var = self.return_frame(instr, symb_index)
+            return current_frame.get_var_value(var, geterr, materialize)
+        return arg.value, arg.type
 
     def MOVE(self, instr):
         """
         MOVE instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         symb_val, symb_type = self.resolve_symb(instr, 1)
-        current_frame.edit_variable(var_name, symb_val, symb_type)
+        current_frame.edit_variable(var, symb_val, symb_type)
 
     def CREATEFRAME(self, _):
         """
@@ -438,8 +3272,8 @@ class Interpret:
         DEFVAR instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        current_frame.define_variable(var_name)
+        current_frame, var = self.return_frame(instr, 0)
+        current_frame.define_variable(var)
 
     def CALL(self, instr):
         """
@@ -447,9 +3281,9 @@ class Interpret:
         :param instr: Current instruction object.
         """
         self.call_stack.append(self.current)
-        if instr[0].text not in self.label.labels_storage:
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
-        self.current = self.label.labels_storage[instr[0].text]
+        self.current = instr.target
 
     def RETURN(self, _):
         """
@@ -467,182 +3301,168 @@ class Interpret:
         :param instr: Current instruction object.
         """
         v1, v1_t = self.resolve_symb(instr, 0)
-        self.data_stack.append([v1, v1_t])
+        self.stack_values.append(v1)
+        self.stack_types.append(v1_t)
 
     def POPS(self, instr):
         """
         POPS instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        if not self.data_stack:
+        current_frame, var = self.return_frame(instr, 0)
+        if not self.stack_values:
             err("Data stack is empty.", ERR_VALUE_MISSING)
-        value = self.data_stack.pop()
-        current_frame.edit_variable(var_name, value[0], value[1])
+        current_frame.edit_variable(var, self.stack_values.pop(), self.stack_types.pop())
 
     def ADD(self, instr):
         """
         ADD instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'int' or v2_t != 'int':
             err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        current_frame.edit_variable(var_name, v1 + v2, 'int')
+        current_frame.edit_variable(var, v1 + v2, 'int')
 
     def SUB(self, instr):
         """
         SUB instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'int' or v2_t != 'int':
             err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        current_frame.edit_variable(var_name, v1 - v2, 'int')
+        current_frame.edit_variable(var, v1 - v2, 'int')
 
     def MUL(self, instr):
         """
         MUL instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'int' or v2_t != 'int':
             err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        current_frame.edit_variable(var_name, v1 * v2, 'int')
+        current_frame.edit_variable(var, v1 * v2, 'int')
 
     def IDIV(self, instr):
         """
         IDIV instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'int' or v2_t != 'int':
             err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
         if v2 == 0:
             err("Division by zero.", ERR_VALUE_WRONG)
-        current_frame.edit_variable(var_name, v1 // v2, 'int')
+        current_frame.edit_variable(var, v1 // v2, 'int')
 
     def LT(self, instr):
         """
         LT instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t == 'nil' or v2_t == 'nil':
             err("Comparison with nil.", ERR_TYPES)
         if v1_t != v2_t:
             err("Comparing values of two different types.", ERR_TYPES)
-        if v1_t == 'bool':
-            v1 = self.bool_ipp_to_py(v1)
-            v2 = self.bool_ipp_to_py(v2)
-        current_frame.edit_variable(var_name, v1 < v2, 'bool')
+        current_frame.edit_variable(var, v1 < v2, 'bool')
 
     def GT(self, instr):
         """
         GT instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t == 'nil' or v2_t == 'nil':
             err("Comparison with nil.", ERR_TYPES)
         if v1_t != v2_t:
             err("Comparing values of two different types.", ERR_TYPES)
-        if v1_t == 'bool':
-            v1 = self.bool_ipp_to_py(v1)
-            v2 = self.bool_ipp_to_py(v2)
-        current_frame.edit_variable(var_name, v1 > v2, 'bool')
+        current_frame.edit_variable(var, v1 > v2, 'bool')
 
     def EQ(self, instr):
         """
         EQ instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t == 'nil' or v2_t == 'nil':
-            current_frame.edit_variable(var_name, v1_t == v2_t, 'bool')
+            current_frame.edit_variable(var, v1_t == v2_t, 'bool')
             return
         if v1_t != v2_t:
             err("Comparing values of two different types.", ERR_TYPES)
-        if v1_t == 'bool':
-            v1 = self.bool_ipp_to_py(v1)
-            v2 = self.bool_ipp_to_py(v2)
-        current_frame.edit_variable(var_name, v1 == v2, 'bool')
+        current_frame.edit_variable(var, v1 == v2, 'bool')
 
     def AND(self, instr):
         """
         AND instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'bool' or v2_t != 'bool':
             err("Logical operators only accept bool values.", ERR_TYPES)
-        v1 = self.bool_ipp_to_py(v1)
-        v2 = self.bool_ipp_to_py(v2)
-        current_frame.edit_variable(var_name, v1 and v2, 'bool')
+        current_frame.edit_variable(var, v1 and v2, 'bool')
 
     def OR(self, instr):
         """
         OR instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t != 'bool' or v2_t != 'bool':
             err("Logical operators only accept bool values.", ERR_TYPES)
-        v1 = self.bool_ipp_to_py(v1)
-        v2 = self.bool_ipp_to_py(v2)
-        current_frame.edit_variable(var_name, v1 or v2, 'bool')
+        current_frame.edit_variable(var, v1 or v2, 'bool')
 
     def NOT(self, instr):
         """
         NOT instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v, v_t = self.resolve_symb(instr, 1)
         if v_t != 'bool':
             err("Logical operators only accept bool values.", ERR_TYPES)
-        v = self.bool_ipp_to_py(v)
-        current_frame.edit_variable(var_name, not v, 'bool')
+        current_frame.edit_variable(var, not v, 'bool')
 
     def INT2CHAR(self, instr):
         """
         INT2CHAR instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v, v_t = self.resolve_symb(instr, 1)
         if v_t != 'int':
             err("INT2CHAR only accepts int value.", ERR_TYPES)
         try:
             value = chr(v)
-        except:
+        except (ValueError, OverflowError):
             err("Unicode code is out of range.", ERR_STRING)
-        current_frame.edit_variable(var_name, value, 'string')
+        current_frame.edit_variable(var, value, 'string')
 
     def STRI2INT(self, instr):
         """
         STRI2INT instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         v, v_t = self.resolve_symb(instr, 1)
         i, i_t = self.resolve_symb(instr, 2)
         if v_t != 'string':
@@ -655,36 +3475,31 @@ class Interpret:
             value = ord(v[i])
         except IndexError:
             err("STRI2INT: index out of range.", ERR_STRING)
-        except:
+        except TypeError:
             err("Unicode code is out of range.", ERR_STRING)
-        current_frame.edit_variable(var_name, value, 'int')
+        current_frame.edit_variable(var, value, 'int')
 
     def READ(self, instr):
         """
         READ instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         try:
-            value = self.prep.int_input.readline()
-        except:
-            err("Unable to read from the input file.", 11)
-        if value == '':
-            value = 'nil'
+            value = self.input.readline()
+        except (OSError, ValueError):
+            err("Unable to read from the input file.", ERR_INPUT_FILE)
+        in_type = instr.args[1].text
+        if value is None:
+            value = None
             in_type = 'nil'
-        else:
-            in_type = instr[1].text
-        value = value.rstrip()
-        if in_type == 'int':
-            if value_validity('int', value):
-                value = int(value)
-            else:
+        elif in_type == 'int':
+            value = parse_int(value)
+            if value is None:
                 in_type = 'nil'
-                value = 'nil'
         elif in_type == 'bool':
-            if value.lower() != 'true':
-                value = 'false'
-        current_frame.edit_variable(var_name, value, in_type)
+            value = value.lower() == 'true'
+        current_frame.edit_variable(var, value, in_type)
 
     def WRITE(self, instr):
         """
@@ -692,40 +3507,39 @@ class Interpret:
         :param instr: Current instruction object.
         """
         value, out_type = self.resolve_symb(instr, 0)
-        if out_type == 'nil':
-            value = ''
-        print(value, end='')
+        self.stdout.write(WRITTEN_TEXT.get(out_type, str)(value))
 
     def CONCAT(self, instr):
         """
         CONCAT instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        s1, s1_t = self.resolve_symb(instr, 1)
+        current_frame, var = self.return_frame(instr, 0)
+        in_place = Optimizer.same_variable(instr.args[0], instr.args[1])
+        s1, s1_t = self.resolve_symb(instr, 1, materialize=not in_place)
         s2, s2_t = self.resolve_symb(instr, 2)
         if s1_t != 'string' or s2_t != 'string':
             err("Value is not of type string.", ERR_TYPES)
-        current_frame.edit_variable(var_name, s1+s2, 'string')
+        current_frame.edit_variable(var, append_string(s1, s2) if in_place else s1 + s2, 'string')
 
     def STRLEN(self, instr):
         """
         STRLEN instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        s, s_t = self.resolve_symb(instr, 1)
+        current_frame, var = self.return_frame(instr, 0)
+        s, s_t = self.resolve_symb(instr, 1, materialize=False)
         if s_t != 'string':
             err("Value is not of type string.", ERR_TYPES)
-        current_frame.edit_variable(var_name, len(s), 'int')
+        current_frame.edit_variable(var, len(s), 'int')
 
     def GETCHAR(self, instr):
         """
         GETCHAR instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        s, s_t = self.resolve_symb(instr, 1)
+        current_frame, var = self.return_frame(instr, 0)
+        s, s_t = self.resolve_symb(instr, 1, materialize=False)
         i, i_t = self.resolve_symb(instr, 2)
         if s_t != 'string' or i_t != 'int':
             err("Invalid value types.", ERR_TYPES)
@@ -736,39 +3550,38 @@ class Interpret:
             char = s[i]
         except IndexError:
             err("GETCHAR: index out of range.", ERR_STRING)
-        current_frame.edit_variable(var_name, char, 'string')
+        current_frame.edit_variable(var, char, 'string')
 
     def SETCHAR(self, instr):
         """
         SETCHAR instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
-        s, s_t = current_frame.get_var_value(var_name)
+        current_frame, var = self.return_frame(instr, 0)
+        s, s_t = current_frame.get_var_value(var, materialize=False)
         i, i_t = self.resolve_symb(instr, 1)
         ch, ch_t = self.resolve_symb(instr, 2)
         if ch_t != 'string' or i_t != 'int' or s_t != 'string':
             err("Invalid value types.", ERR_TYPES)
         try:
             ch = ch[0]
-        except:
+        except IndexError:
             err("SETCHAR: empty character.", ERR_STRING)
         if i < 0 or i >= len(s):
             err("SETCHAR: index out of range.", ERR_STRING)
-        try:
-            s = s[:i] + ch + s[i + 1:]
-        except IndexError:
-            err("SETCHAR: index out of range.", ERR_STRING)
-        current_frame.edit_variable(var_name, s, 'string')
+        if s.__class__ is not StringBuffer:
+            s = StringBuffer(s)
+        s.replace(i, ch)
+        current_frame.edit_variable(var, s, 'string')
 
     def TYPE(self, instr):
         """
         TYPE instruction
         :param instr: Current instruction object.
         """
-        current_frame, var_name = self.return_frame(instr, 0)
+        current_frame, var = self.return_frame(instr, 0)
         t, t_t = self.resolve_symb(instr, 1, False)
-        current_frame.edit_variable(var_name, t_t, 'string')
+        current_frame.edit_variable(var, t_t, 'string')
 
     def LABEL(self, _):
         """
@@ -782,55 +3595,49 @@ class Interpret:
         JUMP instruction
         :param instr: Current instruction object.
         """
-        if instr[0].text not in self.label.labels_storage:
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
-        self.current = self.label.labels_storage[instr[0].text]
+        self.current = instr.target
 
     def JUMPIFEQ(self, instr):
         """
         JUMPIFEQ instruction
         :param instr: Current instruction object.
         """
-        if instr[0].text not in self.label.labels_storage:
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t == 'nil' or v2_t == 'nil':
             if v1_t == v2_t:
-                self.current = self.label.labels_storage[instr[0].text]
+                self.current = instr.target
                 return
             else:
                 return
         if v1_t != v2_t:
             err("Comparing values of two different types.", ERR_TYPES)
-        if v1_t == 'bool':
-            v1 = self.bool_ipp_to_py(v1)
-            v2 = self.bool_ipp_to_py(v2)
         if v1 == v2:
-            self.current = self.label.labels_storage[instr[0].text]
+            self.current = instr.target
 
     def JUMPIFNEQ(self, instr):
         """
         JUMPIFNEQ instruction
         :param instr: Current instruction object.
         """
-        if instr[0].text not in self.label.labels_storage:
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
         v1, v1_t = self.resolve_symb(instr, 1)
         v2, v2_t = self.resolve_symb(instr, 2)
         if v1_t == 'nil' or v2_t == 'nil':
             if v1_t != v2_t:
-                self.current = self.label.labels_storage[instr[0].text]
+                self.current = instr.target
                 return
             else:
                 return
         if v1_t != v2_t:
             err("Comparing values of two different types.", ERR_TYPES)
-        if v1_t == 'bool':
-            v1 = self.bool_ipp_to_py(v1)
-            v2 = self.bool_ipp_to_py(v2)
         if v1 != v2:
-            self.current = self.label.labels_storage[instr[0].text]
+            self.current = instr.target
 
     def EXIT(self, instr):
         """
@@ -843,251 +3650,180 @@ class Interpret:
         value = int(value)
         if value < 0 or value > 49:
             err("EXIT: Value out of range.", ERR_VALUE_WRONG)
-        sys.exit(value)
+        raise ProgramExit(value)
 
     def DPRINT(self, instr):
         """
         DPRINT instruction
         :param instr: Current instruction object.
         """
-        value, _ = self.resolve_symb(instr, 0)
-        print(value, file=sys.stderr)
+        value, value_type = self.resolve_symb(instr, 0)
+        self.stderr.write(f'{ipp_text(value, value_type)}\n')
+
+    @staticmethod
+    def frame_text(frame):
+        """
+        :param frame: Frame object.
+        :return: Dictionary of the defined variables, with the bool and nil values in the IPPcode21 text form.
+        """
+        return {name: cell if cell is None else [cell.type, cell.value if cell.type == 'int'
+                                                 else ipp_text(cell.value, cell.type)]
+                for name, cell in frame.as_dict().items()}
 
     def BREAK(self, instr):
         """
         BREAK instruction
         :param instr: Current instruction object.
         """
-        GF_val = self.GF.variables
+        GF_val = self.frame_text(self.GF)
         if self.TF:
-            TF_val = self.TF.variables
+            TF_val = self.frame_text(self.TF)
         else:
             TF_val = 'None'
         if self.LF:
-            LF_val = self.LF.variables
+            LF_val = self.frame_text(self.LF)
         else:
             LF_val = 'None'
         string = f"\nIndex in the instructions list: {self.current}\n" \
-                 f"Instruction order: {instr.get('order')}\n" \
+                 f"Instruction order: {instr.order}\n" \
                  f"Global frame: \n{GF_val}\n" \
                  f"Temporary frame: \n{TF_val}\n" \
                  f"Local frame: \n{LF_val}\n" \
                  f"Local frames in stack: {len(self.LF_stack)}\n"
-        print(string, file=sys.stderr)
+        self.stderr.write(f'{string}\n')
 
     """
     Instructions for the STACK bonus.
     """
+    def stack_push(self, value, value_type):
+        """
+        Pushes a value to the data stack, the values and their types are kept in parallel lists.
+        :param value: Pushed value.
+        :param value_type: Type of the value.
+        """
+        self.stack_values.append(value)
+        self.stack_types.append(value_type)
+
+    def stack_pop(self):
+        """
+        Pops a value from the data stack.
+        :return: Value and type.
+        """
+        if not self.stack_values:
+            err("The data stack is empty.", ERR_VALUE_MISSING)
+        return self.stack_values.pop(), self.stack_types.pop()
+
+    def stack_operation(self, operation):
+        """
+        Pops two values from the data stack, applies the operation and pushes the result.
+        :param operation: Function computing the result value and type.
+        """
+        v2 = self.stack_pop()
+        v1 = self.stack_pop()
+        self.stack_push(*operation(v1[0], v1[1], v2[0], v2[1]))
+
     def CLEARS(self, _):
         """
         CLEARS instruction - STACK
         :param _: Current instruction object.
         """
-        self.data_stack.clear()
+        self.stack_values.clear()
+        self.stack_types.clear()
 
     def ADDS(self, _):
         """
         ADDS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'int' or v2[1] != 'int':
-            err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        self.data_stack.append([v1[0]+v2[0], 'int'])
+        self.stack_operation(op_add)
 
     def SUBS(self, _):
         """
         SUBS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'int' or v2[1] != 'int':
-            err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        self.data_stack.append([v1[0]-v2[0], 'int'])
+        self.stack_operation(op_sub)
 
     def MULS(self, _):
         """
         MULS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'int' or v2[1] != 'int':
-            err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        self.data_stack.append([v1[0]*v2[0], 'int'])
+        self.stack_operation(op_mul)
 
     def IDIVS(self, _):
         """
         IDIVS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'int' or v2[1] != 'int':
-            err("Non-numeric value in arithmetic instruction.", ERR_TYPES)
-        if v2[0] == 0:
-            err("Division by zero.", ERR_VALUE_WRONG)
-        self.data_stack.append([v1[0] // v2[0], 'int'])
+        self.stack_operation(op_idiv)
 
     def LTS(self, _):
         """
         LTS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] == 'nil' or v2[1] == 'nil':
-            err("Comparison with nil.", ERR_TYPES)
-        if v1[1] != v2[1]:
-            err("Comparing values of two different types.", ERR_TYPES)
-        if v1[1] == 'bool':
-            v1[0] = self.bool_ipp_to_py(v1[0])
-            v2[0] = self.bool_ipp_to_py(v2[0])
-        value = v1[0] < v2[0]
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_operation(op_lt)
 
     def GTS(self, _):
         """
         GTS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] == 'nil' or v2[1] == 'nil':
-            err("Comparison with nil.", ERR_TYPES)
-        if v1[1] != v2[1]:
-            err("Comparing values of two different types.", ERR_TYPES)
-        if v1[1] == 'bool':
-            v1[0] = self.bool_ipp_to_py(v1[0])
-            v2[0] = self.bool_ipp_to_py(v2[0])
-        value = v1[0] > v2[0]
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_operation(op_gt)
 
     def EQS(self, _):
         """
         EQS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] == 'nil' or v2[1] == 'nil':
-            value = (v1[1] == v2[1]) # both are nil
-            value = self.bool_py_to_ipp(value)
-            self.data_stack.append([value, 'bool'])
-            return
-        if v1[1] != v2[1]:
-            err("Comparing values of two different types.", ERR_TYPES)
-        if v1[1] == 'bool':
-            v1[0] = self.bool_ipp_to_py(v1[0])
-            v2[0] = self.bool_ipp_to_py(v2[0])
-        value = (v1[0] == v2[0])
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_operation(op_eq)
 
     def ANDS(self, _):
         """
         ANDS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'bool' or v2[1] != 'bool':
-            err("Logical operators only accept bool values.", ERR_TYPES)
-        v1[0] = self.bool_ipp_to_py(v1[0])
-        v2[0] = self.bool_ipp_to_py(v2[0])
-        value = v1[0] and v2[0]
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_operation(op_and)
 
     def ORS(self, _):
         """
         ORS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if v1[1] != 'bool' or v2[1] != 'bool':
-            err("Logical operators only accept bool values.", ERR_TYPES)
-        v1[0] = self.bool_ipp_to_py(v1[0])
-        v2[0] = self.bool_ipp_to_py(v2[0])
-        value = v1[0] or v2[0]
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_operation(op_or)
 
     def NOTS(self, _):
         """
         NOTS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
+        v = self.stack_pop()
         if v[1] != 'bool':
             err("Logical operators only accept bool values.", ERR_TYPES)
-        v[0] = self.bool_ipp_to_py(v[0])
-        value = not v[0]
-        value = self.bool_py_to_ipp(value)
-        self.data_stack.append([value, 'bool'])
+        self.stack_push(not v[0], 'bool')
 
     def INT2CHARS(self, _):
         """
         INT2CHARS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            v = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
+        v = self.stack_pop()
         if v[1] != 'int':
             err("INT2CHAR only accepts int value.", ERR_TYPES)
         try:
             value = chr(v[0])
-        except:
+        except (ValueError, OverflowError):
             err("Unicode code is out of range.", ERR_STRING)
-        self.data_stack.append([value, 'string'])
+        self.stack_push(value, 'string')
 
     def STRI2INTS(self, _):
         """
         STR2INTS instruction - STACK
         :param _: Current instruction object.
         """
-        try:
-            i = self.data_stack.pop()
-            v = self.data_stack.pop()
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
+        i = self.stack_pop()
+        v = self.stack_pop()
         if v[1] != 'string':
             err("STRI2INT only accepts string value.", ERR_TYPES)
         if i[1] != 'int':
@@ -1098,63 +3834,711 @@ class Interpret:
             value = ord(v[0][i[0]])
         except IndexError:
             err("STRI2INT: index out of range.", ERR_STRING)
-        except:
+        except TypeError:
             err("Unicode code is out of range.", ERR_STRING)
-        self.data_stack.append([value, 'int'])
+        self.stack_push(value, 'int')
 
     def JUMPIFEQS(self, instr):
         """
         JUMPIFEQS instruction - STACK
         :param instr: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-            lbl = instr[0].text
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if lbl not in self.label.labels_storage:
+        v2 = self.stack_pop()
+        v1 = self.stack_pop()
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
-        if v1[1] == 'nil' or v2[1] == 'nil':
-            if v1[1] == v2[1]:
-                self.current = self.label.labels_storage[lbl]
-                return
-            else:
-                return
-        if v1[1] != v2[1]:
-            err("Comparing values of two different types.", ERR_TYPES)
-        if v1[1] == 'bool':
-            v1[0] = self.bool_ipp_to_py(v1[0])
-            v2[0] = self.bool_ipp_to_py(v2[0])
-        if v1[0] == v2[0]:
-            self.current = self.label.labels_storage[lbl]
+        result, _ = op_eq(v1[0], v1[1], v2[0], v2[1])
+        if result:
+            self.current = instr.target
 
     def JUMPIFNEQS(self, instr):
         """
         JUMPIFNEQS instruction - STACK
         :param instr: Current instruction object.
         """
-        try:
-            v2 = self.data_stack.pop()
-            v1 = self.data_stack.pop()
-            lbl = instr[0].text
-        except:
-            err("The data stack is empty.", ERR_VALUE_MISSING)
-        if lbl not in self.label.labels_storage:
+        v2 = self.stack_pop()
+        v1 = self.stack_pop()
+        if instr.target is None:
             err("Label does not exist.", ERR_SEM)
-        if v1[1] == 'nil' or v2[1] == 'nil':
-            if v1[1] != v2[1]:
-                self.current = self.label.labels_storage[lbl]
-                return
-            else:
-                return
-        if v1[1] != v2[1]:
-            err("Comparing values of two different types.", ERR_TYPES)
-        if v1[1] == 'bool':
-            v1[0] = self.bool_ipp_to_py(v1[0])
-            v2[0] = self.bool_ipp_to_py(v2[0])
-        if v1[0] != v2[0]:
-            self.current = self.label.labels_storage[lbl]
+        result, _ = op_eq(v1[0], v1[1], v2[0], v2[1])
+        if not result:
+            self.current = instr.target
+
+    """
+    Fused instructions created by the Optimizer.
+    """
+    def COMPARE_JUMP_TRUE(self, instr):
+        """
+        LT/GT/EQ followed by a conditional jump taken when the comparison is true.
+        :param instr: Current instruction object.
+        """
+        if self.compare_and_store(instr):
+            self.current = instr.target
+
+    def COMPARE_JUMP_FALSE(self, instr):
+        """
+        LT/GT/EQ followed by a conditional jump taken when the comparison is false.
+        :param instr: Current instruction object.
+        """
+        if not self.compare_and_store(instr):
+            self.current = instr.target
+
+    def compare_and_store(self, instr):
+        """
+        Compares the symbols and stores the result, as the comparison instruction would.
+        :param instr: Current instruction object.
+        :return: Python boolean result.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, v1_t = self.resolve_symb(instr, 1)
+        v2, v2_t = self.resolve_symb(instr, 2)
+        result, _ = instr.operation(v1, v1_t, v2, v2_t)
+        current_frame.edit_variable(var, result, 'bool')
+        if instr.target is None:
+            err("Label does not exist.", ERR_SEM)
+        return result
+
+    def STACK_OPERATION(self, instr):
+        """
+        PUSHS, PUSHS, binary stack operation, POPS - computed without using the data stack.
+        :param instr: Current instruction object.
+        """
+        v1, v1_t = self.resolve_symb(instr, 0)
+        v2, v2_t = self.resolve_symb(instr, 1)
+        value, value_t = instr.operation(v1, v1_t, v2, v2_t)
+        current_frame, var = self.return_frame(instr, 2)
+        current_frame.edit_variable(var, value, value_t)
+
+    """
+    Instructions with the operand types proven by the Optimizer, they skip the type checks.
+    """
+    def ADD_INT(self, instr):
+        """
+        ADD instruction - both operands are int
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 + v2, 'int')
+
+    def SUB_INT(self, instr):
+        """
+        SUB instruction - both operands are int
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 - v2, 'int')
+
+    def MUL_INT(self, instr):
+        """
+        MUL instruction - both operands are int
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 * v2, 'int')
+
+    def IDIV_INT(self, instr):
+        """
+        IDIV instruction - both operands are int
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        if v2 == 0:
+            err("Division by zero.", ERR_VALUE_WRONG)
+        current_frame.edit_variable(var, v1 // v2, 'int')
+
+    def LT_TYPED(self, instr):
+        """
+        LT instruction - operands of the same type other than nil
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 < v2, 'bool')
+
+    def GT_TYPED(self, instr):
+        """
+        GT instruction - operands of the same type other than nil
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 > v2, 'bool')
+
+    def EQ_TYPED(self, instr):
+        """
+        EQ instruction - operands of the same type
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 == v2, 'bool')
+
+    def AND_BOOL(self, instr):
+        """
+        AND instruction - both operands are bool
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 and v2, 'bool')
+
+    def OR_BOOL(self, instr):
+        """
+        OR instruction - both operands are bool
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, v1 or v2, 'bool')
+
+    def NOT_BOOL(self, instr):
+        """
+        NOT instruction - the operand is bool
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        v, _ = self.resolve_symb(instr, 1)
+        current_frame.edit_variable(var, not v, 'bool')
+
+    def CONCAT_STRING(self, instr):
+        """
+        CONCAT instruction - both operands are string
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        in_place = Optimizer.same_variable(instr.args[0], instr.args[1])
+        s1, _ = self.resolve_symb(instr, 1, materialize=not in_place)
+        s2, _ = self.resolve_symb(instr, 2)
+        current_frame.edit_variable(var, append_string(s1, s2) if in_place else s1 + s2, 'string')
+
+    def STRLEN_STRING(self, instr):
+        """
+        STRLEN instruction - the operand is string
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        s, _ = self.resolve_symb(instr, 1, materialize=False)
+        current_frame.edit_variable(var, len(s), 'int')
+
+    def GETCHAR_TYPED(self, instr):
+        """
+        GETCHAR instruction - string and int operands
+        :param instr: Current instruction object.
+        """
+        current_frame, var = self.return_frame(instr, 0)
+        s, _ = self.resolve_symb(instr, 1, materialize=False)
+        i, _ = self.resolve_symb(instr, 2)
+        if i >= len(s) or i < 0:
+            err("Index out of range.", ERR_STRING)
+        current_frame.edit_variable(var, s[i], 'string')
+
+    def JUMPIFEQ_TYPED(self, instr):
+        """
+        JUMPIFEQ instruction - operands of the same type
+        :param instr: Current instruction object.
+        """
+        if instr.target is None:
+            err("Label does not exist.", ERR_SEM)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        if v1 == v2:
+            self.current = instr.target
+
+    def JUMPIFNEQ_TYPED(self, instr):
+        """
+        JUMPIFNEQ instruction - operands of the same type
+        :param instr: Current instruction object.
+        """
+        if instr.target is None:
+            err("Label does not exist.", ERR_SEM)
+        v1, _ = self.resolve_symb(instr, 1)
+        v2, _ = self.resolve_symb(instr, 2)
+        if v1 != v2:
+            self.current = instr.target
+
+
+class ProgramTimeout(BaseException):
+    """
+    Raised by the timer of the batch when a program runs out of its time limit. It is not an Exception,
+    so that the handlers of the instructions can not mistake it for an error of the program.
+    """
+
+
+class Batch:
+    """
+    Runs many programs in one process, each by a fresh Interpret. The programs are listed in a JSON manifest,
+    or they are the .src files of a directory tree laid out as for test.php. The output and the exit code
+    of every program are captured and compared with the expected ones. With more jobs, the programs are
+    spread over a pool of worker processes, each of them running many programs as well.
+    """
+    def __init__(self, prep):
+        self.args = prep.args
+        self.report_path = prep.batch_report
+        self.jobs = prep.args.jobs or os.cpu_count()
+        self.timeout = prep.args.timeout
+        self.quantum = prep.args.quantum
+        self.programs = self.find_programs(prep.batch)
+
+    @staticmethod
+    def find_programs(path):
+        """
+        Lists the programs. A directory is searched recursively for .src files, the .in, .out and .rc files
+        of the same name are optional and default to an empty input, an empty output and exit code 0.
+        As in test.php, the output is only compared when the program ends with exit code 0.
+        A manifest is a JSON list of objects with the "source" path and optionally the "input" path,
+        the expected "rc", 0 as for a directory if not given or any exit code if null, and the path
+        to the expected "output". Relative paths start at the manifest.
+        :param path: Path to the directory or to the manifest.
+        :return: List of dictionaries with the name, source, input, rc and output of every program.
+        """
+        programs = []
+        if os.path.isdir(path):
+            for directory, subdirectories, files in os.walk(path):
+                subdirectories.sort()
+                for file in sorted(files):
+                    if not file.endswith('.src'):
+                        continue
+                    base = os.path.join(directory, file[:-4])
+                    rc = 0
+                    if os.path.exists(base + '.rc'):
+                        with open(base + '.rc') as rc_file:
+                            text = rc_file.read().strip()
+                        try:
+                            rc = int(text or 0)
+                        except ValueError:
+                            err(f"Invalid exit code in '{base}.rc'.", ERR_INPUT_FILE)
+                    programs.append({'name': os.path.relpath(base, path), 'source': base + '.src',
+                                     'input': base + '.in' if os.path.exists(base + '.in') else None,
+                                     'rc': rc, 'output': base + '.out' if os.path.exists(base + '.out') else os.devnull})
+            return programs
+        try:
+            with open(path) as manifest:
+                entries = json.load(manifest)
+        except (OSError, ValueError):
+            err("Unable to read the batch manifest.", ERR_INPUT_FILE)
+        root = os.path.dirname(os.path.abspath(path))
+        if not isinstance(entries, list):
+            err("The batch manifest is not a list.", ERR_INPUT_FILE)
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('source'), str):
+                err(f"Manifest entry without a source: {json.dumps(entry)}", ERR_INPUT_FILE)
+            if not isinstance(entry.get('rc', 0), (int, type(None))):
+                err(f"Invalid exit code in the manifest entry of '{entry['source']}'.", ERR_INPUT_FILE)
+            program = {'name': entry.get('name', entry['source']), 'rc': entry.get('rc', 0), 'output': None}
+            for key in ['source', 'input', 'output']:
+                if entry.get(key) is not None:
+                    program[key] = os.path.join(root, entry[key])
+                    if key != 'source' and not os.path.isfile(program[key]):
+                        err(f"The {key} file '{entry[key]}' of the manifest entry of '{entry['source']}' "
+                            f"does not exist.", ERR_INPUT_FILE)
+            program.setdefault('input', None)
+            programs.append(program)
+        return programs
+
+    def run(self):
+        """
+        Runs all programs and prints a line for each of them and a summary.
+        :return: Exit code of the batch, 0 if all programs ended as expected.
+        """
+        start = time.perf_counter()
+        if self.jobs > 1 and len(self.programs) > 1:
+            results = self.run_parallel()
+        elif self.quantum:
+            results = self.run_scheduled()
+        else:
+            results = [self.run_program(program) for program in self.programs]
+        return self.report(results, time.perf_counter() - start)
+
+    def run_scheduled(self):
+        """
+        Runs all programs interleaved in this thread, each as an asyncio task.
+        :return: List of the result dictionaries.
+        """
+        import asyncio
+
+        async def run_all():
+            return await asyncio.gather(*(self.run_program_scheduled(program, asyncio.StreamReader())
+                                          for program in self.programs))
+        return asyncio.run(run_all())
+
+    async def run_program_scheduled(self, program, reader):
+        """
+        Runs a program by Interpret.run_async. The time limit counts from the start of the program,
+        including the time the other programs run. The input file is complete, so it is fed to the reader
+        at once and READ never waits here, the programs only take turns after every quantum.
+        :param program: Dictionary of the program from find_programs.
+        :param reader: Empty asyncio.StreamReader for the input of the program.
+        :return: Dictionary of the result.
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        timed_out = False
+        start = time.perf_counter()
+        try:
+            interpret = Interpret(Preparation(self.program_args(program)), stdout, stderr)
+            reader.feed_data(interpret.prep.int_input.buffer.read())
+            reader.feed_eof()
+            interpret.input = AsyncInput(reader)
+            rc = await interpret.run_async(self.quantum, Limits(timeout=self.timeout))
+        except InterpretError as error:
+            stderr.write(error.message)
+            rc = error.code
+        except LimitExceeded:
+            rc = None
+            timed_out = True
+        except Exception as error:
+            stderr.write(f'Internal error: {error!r}')
+            rc = ERR_INTERNAL
+        return self.result(program, rc, timed_out, time.perf_counter() - start, stdout, stderr)
+
+    def run_parallel(self):
+        """
+        Runs the programs in worker processes. The workers import the interpreter once and run chunks
+        of programs, the results keep the order of the programs.
+        :return: List of the result dictionaries.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        jobs = min(self.jobs, len(self.programs))
+        chunk_size = max(1, len(self.programs) // (jobs * 8))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(self.run_program, self.programs, chunksize=chunk_size))
+
+    def report(self, results, elapsed):
+        """
+        Prints the results and writes the JSON report.
+        :param results: List of the result dictionaries.
+        :param elapsed: Wall time of the batch in seconds.
+        :return: Exit code of the batch, 0 if all programs ended as expected.
+        """
+        failed = 0
+        for result in results:
+            if result['passed']:
+                sys.stdout.write(f"PASS {result['name']}\n")
+                continue
+            failed += 1
+            reasons = []
+            if result['timed_out']:
+                reasons.append(f'timed out after {self.timeout} s')
+            elif result['expected_rc'] not in [None, result['rc']]:
+                reasons.append(f"exit code {result['rc']}, expected {result['expected_rc']}")
+            if not result['output_matches']:
+                reasons.append('output differs')
+            sys.stdout.write(f"FAIL {result['name']}: {', '.join(reasons)}\n")
+        sys.stdout.write(f'{len(results)} programs, {len(results) - failed} passed, {failed} failed '
+                         f'in {elapsed:.3f} s\n')
+        if self.report_path:
+            with open(self.report_path, 'w') as file:
+                json.dump(results, file, indent=2)
+                file.write('\n')
+        return 1 if failed else 0
+
+    def run_program(self, program):
+        """
+        Runs a program with the options of the batch and captures its output.
+        :param program: Dictionary of the program from find_programs.
+        :return: Dictionary of the result.
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        timed_out = False
+        start = time.perf_counter()
+        if self.timeout:
+            previous_handler = signal.signal(signal.SIGALRM, self.expire)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            try:
+                rc = Interpret(Preparation(self.program_args(program)), stdout, stderr).run()
+            finally:
+                # * the timer may still fire until it is cancelled, that is caught below as a timeout
+                if self.timeout:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except InterpretError as error:
+            stderr.write(error.message)
+            rc = error.code
+        except ProgramTimeout:
+            rc = None
+            timed_out = True
+        except Exception as error:
+            stderr.write(f'Internal error: {error!r}')
+            rc = ERR_INTERNAL
+        finally:
+            if self.timeout:
+                signal.signal(signal.SIGALRM, previous_handler)
+        return self.result(program, rc, timed_out, time.perf_counter() - start, stdout, stderr)
+
+    @staticmethod
+    def result(program, rc, timed_out, elapsed, stdout, stderr):
+        """
+        Compares the results of a program with the expected ones.
+        :param program: Dictionary of the program from find_programs.
+        :param rc: Exit code, None if the program timed out.
+        :param timed_out: True if the program timed out.
+        :param elapsed: Wall time of the program in seconds.
+        :param stdout: StringIO with the output.
+        :param stderr: StringIO with the error output.
+        :return: Dictionary of the result.
+        """
+        output_matches = True
+        if program['output'] is not None and rc == 0:
+            with open(program['output']) as file:
+                output_matches = stdout.getvalue() == file.read()
+        expected_rc = program['rc']
+        return {'name': program['name'], 'rc': rc, 'expected_rc': expected_rc, 'timed_out': timed_out,
+                'output_matches': output_matches,
+                'passed': not timed_out and output_matches and expected_rc in [None, rc], 'time_s': elapsed,
+                'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+    def __getstate__(self):
+        """
+        Only the options are sent to the worker processes, the programs are sent one by one.
+        """
+        state = dict(self.__dict__)
+        state['programs'] = None
+        return state
+
+    def program_args(self, program):
+        """
+        :param program: Dictionary of the program from find_programs.
+        :return: Arguments of the batch without the batch options, with the source and input of the program.
+        """
+        return argparse.Namespace(**{**vars(self.args), 'batch': None, 'jobs': 1, 'timeout': None, 'quantum': None,
+                                     'source': program['source'], 'input': program['input'] or os.devnull})
+
+    @staticmethod
+    def expire(*_):
+        """
+        Handler of the timer signal.
+        """
+        raise ProgramTimeout()
+
+
+class ServerStream:
+    """
+    Text stream of a served program, every written text is sent to the client as a message.
+    """
+    def __init__(self, send, name):
+        """
+        :param send: Function sending a message to the client.
+        :param name: Name of the stream in the messages, 'stdout' or 'stderr'.
+        """
+        self.send = send
+        self.name = name
+
+    def write(self, text):
+        """
+        :param text: Written text, nothing is sent if it is empty.
+        """
+        if text:
+            self.send({self.name: text})
+
+    def flush(self):
+        """
+        The texts are sent as soon as they are written.
+        """
+
+
+class Server:
+    """
+    Runs the programs of the requests received on a Unix domain socket, every connection in its own thread.
+    A request is a JSON object on a single line with the "source" XML text and optionally the "input" text,
+    the "max_instructions" and the "timeout" in seconds. The limits of the server apply when a request
+    does not set lower ones. The response are JSON lines, {"stdout": text} and {"stderr": text} while the
+    program runs, {"rc": code} at the end, with the "error" message if the program failed and the exceeded
+    "limit" if it was stopped. A connection can send any number of requests, one after another.
+    Every request is run by a fresh Interpret, only the cache of the compiled programs is shared.
+    """
+    CACHE_ENTRIES = 256
+
+    def __init__(self, prep):
+        self.path = prep.serve
+        self.args = argparse.Namespace(**{**vars(prep.args), 'serve': None})
+        self.max_instructions = prep.args.max_instructions
+        self.timeout = prep.args.timeout
+        self.cache = ProgramMemoryCache(self.CACHE_ENTRIES)
+
+    def run(self):
+        """
+        Serves the requests until interrupted.
+        :return: Exit code of the server.
+        """
+        import socket
+        import threading
+        self.remove_socket()
+        signal.signal(signal.SIGTERM, self.stop)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.path)
+            listener.listen()
+            while True:
+                connection, _ = listener.accept()
+                threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            listener.close()
+            self.remove_socket()
+
+    def remove_socket(self):
+        """
+        Removes the socket left at the path, any other file is kept.
+        """
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            err(f"'{self.path}' exists and is not a socket.", ERR_INPUT_FILE)
+        os.remove(self.path)
+
+    @staticmethod
+    def stop(*_):
+        """
+        Handler of SIGTERM, stops the server as an interrupt does.
+        """
+        raise KeyboardInterrupt()
+
+    def serve_connection(self, connection):
+        """
+        Reads the requests of a connection and runs them.
+        :param connection: Connected socket.
+        """
+        with connection, connection.makefile('rb') as reader, connection.makefile('wb') as writer:
+            def send(message):
+                writer.write(json.dumps(message).encode() + b'\n')
+                writer.flush()
+            try:
+                for line in reader:
+                    if line.strip():
+                        send(self.serve_request(line, send))
+            except (OSError, ValueError):
+                pass
+
+    def serve_request(self, line, send):
+        """
+        Runs the program of a request.
+        :param line: Line of the request.
+        :param send: Function sending a message to the client.
+        :return: The final message of the response.
+        """
+        try:
+            request = json.loads(line)
+            source = request['source'].encode()
+            input_text = request.get('input', '')
+            limits = Limits(self.limit(request.get('max_instructions'), self.max_instructions),
+                            self.limit(request.get('timeout'), self.timeout))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {'rc': None, 'error': 'Invalid request.'}
+        try:
+            prep = Preparation(self.args, source, io.StringIO(input_text), self.cache)
+            return {'rc': Interpret(prep, ServerStream(send, 'stdout'), ServerStream(send, 'stderr')).run(limits)}
+        except InterpretError as error:
+            return {'rc': error.code, 'error': error.message}
+        except LimitExceeded as error:
+            return {'rc': None, 'error': error.message, 'limit': error.limit}
+        except Exception as error:
+            return {'rc': ERR_INTERNAL, 'error': f'Internal error: {error!r}'}
+
+    @staticmethod
+    def limit(requested, maximum):
+        """
+        :param requested: Limit set by the request or None.
+        :param maximum: Limit of the server or None.
+        :return: The lower of the limits.
+        :raises ValueError: When the requested limit is not a positive finite number.
+        """
+        if requested is not None and (isinstance(requested, bool) or not isinstance(requested, (int, float))
+                                      or not 0 < requested < float('inf')):
+            raise ValueError('The limit is not a positive finite number.')
+        if requested is None or maximum is None:
+            return maximum if requested is None else requested
+        return min(requested, maximum)
+
+
+def run(program, input_stream=None, output_stream=None, error_stream=None, **options):
+    """
+    Runs a program in the calling thread. Nothing is shared with other runs, so programs can be run
+    concurrently from several threads.
+    :param program: Path to the source XML, the XML document as bytes or a binary stream.
+    :param input_stream: Text stream read by READ, an empty input if None.
+    :param output_stream: Text stream written by WRITE, sys.stdout if None.
+    :param error_stream: Text stream written by DPRINT, BREAK and the optimizer report, sys.stderr if None.
+    :param options: Options of the command line with underscores, e.g. opt_level=3 or engine='closure'.
+    :return: Exit code of the program, 0 or the value of EXIT.
+    :raises InterpretError: When the program is invalid or stops with an error, the code is in its code attribute.
+    :raises ValueError: When profiling is combined with the codegen engine, as on the command line.
+    """
+    prep = Preparation(library_args(options), program, input_stream if input_stream is not None else io.StringIO())
+    return Interpret(prep, output_stream, error_stream).run()
+
+
+def library_args(options):
+    """
+    :param options: Options of the command line with underscores.
+    :return: Namespace of the arguments with the defaults of the command line.
+    :raises TypeError: When an option is unknown or only makes sense on the command line.
+    """
+    args = Preparation.argument_parser().parse_args([])
+    for name, value in options.items():
+        if name in ['source', 'input', 'batch', 'batch_report', 'jobs', 'timeout', 'serve', 'max_instructions',
+                    'quantum'] or not hasattr(args, name):
+            raise TypeError(f'Unknown option {name}.')
+        setattr(args, name, value)
+    return args
+
+
+async def run_async(program, reader=None, output_stream=None, error_stream=None, quantum=QUANTUM, **options):
+    """
+    Runs a program as an asyncio task, which lets the other tasks run after every quantum of instructions
+    and while READ waits for the input. Many programs can be run interleaved in one thread, e.g. by
+    asyncio.gather. Not supported by the codegen engine.
+    :param program: Path to the source XML, the XML document as bytes or a binary stream.
+    :param reader: asyncio.StreamReader read by READ, an empty input if None.
+    :param output_stream: Text stream written by WRITE, sys.stdout if None.
+    :param error_stream: Text stream written by DPRINT, BREAK and the optimizer report, sys.stderr if None.
+    :param quantum: Number of instructions executed at a time.
+    :param options: Options of the command line with underscores, as for run.
+    :return: Exit code of the program, 0 or the value of EXIT.
+    :raises InterpretError: When the program is invalid or stops with an error, the code is in its code attribute.
+    """
+    import asyncio
+    args = library_args(options)
+    if args.engine == 'codegen':
+        raise ValueError('The codegen engine can not be scheduled.')
+    if reader is None:
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+    interpret = Interpret(Preparation(args, program, io.StringIO()), output_stream, error_stream)
+    interpret.input = AsyncInput(reader)
+    return await interpret.run_async(quantum)
+
+
+def main():
+    """
+    The command line interface.
+    :return: Exit code of the interpret.
+    """
+    try:
+        preparation = Preparation()
+        if preparation.batch:
+            return Batch(preparation).run()
+        if preparation.serve:
+            return Server(preparation).run()
+        return Interpret(preparation).run()
+    except InterpretError as error:
+        sys.stderr.write(error.message)
+        return error.code
 
 
-Interpret()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""test_batch.py: VUT FIT - IPP, tests of the batch mode of interpret.py.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+INTERPRET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'interpret.py')
+
+"""
+Endless loop of instructions whose handlers catch the errors of their operands.
+"""
+LOOP = '''<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode21">
+  <instruction order="1" opcode="DEFVAR"><arg1 type="var">GF@i</arg1></instruction>
+  <instruction order="2" opcode="DEFVAR"><arg1 type="var">GF@c</arg1></instruction>
+  <instruction order="3" opcode="MOVE"><arg1 type="var">GF@i</arg1><arg2 type="int">0</arg2></instruction>
+  <instruction order="4" opcode="LABEL"><arg1 type="label">loop</arg1></instruction>
+  <instruction order="5" opcode="ADD"><arg1 type="var">GF@i</arg1><arg2 type="var">GF@i</arg2><arg3 type="int">1</arg3></instruction>
+  <instruction order="6" opcode="INT2CHAR"><arg1 type="var">GF@c</arg1><arg2 type="int">65</arg2></instruction>
+  <instruction order="7" opcode="JUMP"><arg1 type="label">loop</arg1></instruction>
+</program>
+'''
+
+
+class BatchTimeoutTest(unittest.TestCase):
+    """
+    Every endless program of a batch has to end by its time limit, whichever instruction the timer interrupts.
+    """
+    PROGRAMS = 20
+
+    def run_batch(self, *options):
+        """
+        Runs a batch of endless programs.
+        :param options: Extra options of interpret.py.
+        :return: List of the results from the batch report.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for number in range(self.PROGRAMS):
+                with open(os.path.join(directory, f'loop{number}.src'), 'w') as source:
+                    source.write(LOOP)
+            report = os.path.join(directory, 'report.json')
+            subprocess.run([sys.executable, INTERPRET, f'--batch={directory}', f'--batch-report={report}',
+                            '--timeout=0.05', *options], stdout=subprocess.DEVNULL, check=False)
+            with open(report) as report_file:
+                return json.load(report_file)
+
+    def test_sequential(self):
+        results = self.run_batch()
+        self.assertEqual(len(results), self.PROGRAMS)
+        for result in results:
+            self.assertTrue(result['timed_out'], f"{result['name']}: rc {result['rc']}, {result['stderr']}")
+
+    def test_scheduled(self):
+        for result in self.run_batch('--quantum=100'):
+            self.assertTrue(result['timed_out'], f"{result['name']}: rc {result['rc']}, {result['stderr']}")
+
+
+if __name__ == '__main__':
+    unittest.main()
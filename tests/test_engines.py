@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""test_engines.py: VUT FIT - IPP, differential tests of the execution engines and optimizer levels of interpret.py.
+__author__  = "Tereza Burianova"
+__email__   = "xburia28@vutbr.cz"
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(os.path.dirname(TESTS), 'interpret.py')
+
+"""
+Programs laid out as for test.php, the .out and .rc files hold the results of the reference engine
+without optimizations. Programs with an .err file have their error output of DPRINT and BREAK compared too.
+"""
+CORPUS = os.path.join(TESTS, 'engines')
+
+ENGINES = ['reference', 'closure', 'codegen']
+OPT_LEVELS = [0, 1, 2, 3]
+
+
+class EnginesTest(unittest.TestCase):
+    """
+    Every engine at every optimizer level has to end every program of the corpus with the expected exit code
+    and output, also when the program stops with an error.
+    """
+    def run_corpus(self, engine, opt_level):
+        """
+        Runs the corpus as a batch.
+        :param engine: Execution engine.
+        :param opt_level: Optimizer level.
+        :return: List of the results from the batch report.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            report = os.path.join(directory, 'report.json')
+            subprocess.run([sys.executable, INTERPRET, f'--batch={CORPUS}', f'--batch-report={report}',
+                            f'--engine={engine}', f'--opt-level={opt_level}'], stdout=subprocess.DEVNULL, check=False)
+            with open(report) as report_file:
+                return json.load(report_file)
+
+    def test_engines(self):
+        for engine in ENGINES:
+            for opt_level in OPT_LEVELS:
+                with self.subTest(engine=engine, opt_level=opt_level):
+                    results = self.run_corpus(engine, opt_level)
+                    self.assertEqual(len(results), len([file for file in os.listdir(CORPUS) if file.endswith('.src')]))
+                    for result in results:
+                        base = os.path.join(CORPUS, result['name'])
+                        with open(base + '.rc') as rc_file, open(base + '.out') as output_file:
+                            expected = (int(rc_file.read()), output_file.read())
+                        self.assertEqual((result['rc'], result['stdout']), expected, result['name'])
+                        if os.path.exists(base + '.err'):
+                            with open(base + '.err') as error_file:
+                                self.assertEqual(result['stderr'], error_file.read(), result['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()